@@ -0,0 +1,76 @@
+import click
+import logging
+import os
+import sys
+import tempfile
+
+from benchmark.generator import generate
+from benchmark.runner import run_benchmarks, compare_results, load_baseline, save_baseline
+
+logging.basicConfig(
+    level=logging.INFO,
+    format= '[%(asctime)s] %(levelname)s: %(message)s',
+    datefmt='%H:%M:%S'
+)
+
+@click.command
+@click.option('--input', '-i', default=None, help='ISA input directory, a synthetic dataset is generated if omitted')
+@click.option('--stops', default=500, type=int, help='number of stations of the synthetic dataset')
+@click.option('--lines', default=20, type=int, help='number of lines of the synthetic dataset')
+@click.option('--sub-lines', default=4, type=int, help='number of sub lines per line version of the synthetic dataset')
+@click.option('--trips', default=50, type=int, help='number of trips per sub line of the synthetic dataset')
+@click.option('--time-demand-types', default=3, type=int, help='number of time demand types per sub line of the synthetic dataset')
+@click.option('--repeat', '-r', default=3, type=int, help='number of repetitions, the fastest run is taken')
+@click.option('--workers', '-w', default=1, type=int, help='number of worker processes for converting lines')
+@click.option('--baseline', '-b', default=os.path.join(os.path.dirname(__file__), 'baseline.json'), help='baseline JSON file')
+@click.option('--update-baseline', is_flag=True, default=False, help='store the results as new baseline')
+@click.option('--tolerance', '-t', default=0.25, type=float, help='allowed slowdown compared to the baseline')
+def main(input, stops, lines, sub_lines, trips, time_demand_types, repeat, workers, baseline, update_baseline, tolerance):
+    parameters = {
+        'input': input,
+        'stops': stops,
+        'lines': lines,
+        'sub_lines': sub_lines,
+        'trips': trips,
+        'time_demand_types': time_demand_types,
+        'workers': workers
+    }
+
+    with tempfile.TemporaryDirectory() as input_directory:
+        if input is None:
+            logging.info(f"generating synthetic dataset with {stops} stations, {lines} lines, {sub_lines} sub lines, {trips} trips and {time_demand_types} time demand types ...")
+            generate(input_directory, num_stops=stops, num_lines=lines, num_sub_lines=sub_lines, num_trips=trips, num_time_demand_types=time_demand_types)
+        else:
+            input_directory = input
+
+        results = run_benchmarks(input_directory, repeat=repeat, workers=workers)
+
+    for group_name, group_results in results.items():
+        for name, seconds in group_results.items():
+            click.echo(f"{group_name}.{name}: {seconds:.4f}s")
+
+    if update_baseline:
+        logging.info(f"storing baseline {baseline} ...")
+        save_baseline(baseline, parameters, results)
+        return
+
+    if not os.path.isfile(baseline):
+        logging.warning(f"baseline {baseline} not found - run with --update-baseline to create one")
+        return
+
+    baseline_data = load_baseline(baseline)
+    if baseline_data['parameters'] != parameters:
+        logging.error(f"baseline {baseline} was created with different parameters {baseline_data['parameters']}")
+        sys.exit(2)
+
+    regressions = compare_results(results, baseline_data['results'], tolerance)
+    for name, baseline_seconds, seconds in regressions:
+        logging.error(f"{name} regressed from {baseline_seconds:.4f}s to {seconds:.4f}s")
+
+    if len(regressions) > 0:
+        sys.exit(1)
+
+    logging.info('no regressions found')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import os
+import random
+
+from datetime import datetime, timedelta
+
+from isa2gtfs.asc import create_asc_file
+
+########################################################################################################################
+# Generator for consistent synthetic ISA datasets of arbitrary size.
+########################################################################################################################
+
+_BITFIELD_LENGTH = 250
+
+def generate(output_directory, num_stops=100, num_lines=10, num_sub_lines=4, num_trips=20, num_time_demand_types=3, num_stops_per_sub_line=15, num_versions=2, start_date='01.01.2026', seed=1):
+    os.makedirs(output_directory, exist_ok=True)
+
+    rnd = random.Random(seed)
+
+    # stations with two stop points each
+    asc_attribut = create_asc_file('ATTRIBUT.ASC')
+    asc_attribut.records.append(asc_attribut.create_record({'ID': 'GL', 'ShortName': 'GLEIS', 'IsMetaAttribute': False}))
+
+    asc_halteste = create_asc_file('HALTESTE.ASC')
+    asc_hstattri = create_asc_file('HSTATTRI.ASC')
+    asc_tarif = create_asc_file('TARIF.ASC')
+
+    stop_ids = list()
+    for station_id in range(1, num_stops + 1):
+        longitude = round(rnd.uniform(8.0, 9.0), 6)
+        latitude = round(rnd.uniform(48.5, 49.5), 6)
+
+        asc_halteste.records.append(asc_halteste.create_record({
+            'ID': station_id,
+            'DelivererID': 'SYN',
+            'StationType': 'H',
+            'Longitude': longitude,
+            'Latitude': latitude,
+            'LongName': f"Station {station_id}",
+            'HeadsignText': f"Station {station_id}",
+            'InternationalStationID': f"de:00000:{station_id}"
+        }))
+
+        for platform in range(1, 3):
+            stop_id = num_stops + (station_id - 1) * 2 + platform
+
+            asc_halteste.records.append(asc_halteste.create_record({
+                'ID': stop_id,
+                'DelivererID': 'SYN',
+                'ParentID': station_id,
+                'ParentDelivererID': 'SYN',
+                'StationType': 'P',
+                'Longitude': longitude,
+                'Latitude': latitude,
+                'LongName': f"Station {station_id}",
+                'InternationalStationID': f"de:00000:{station_id}:{platform}"
+            }))
+
+            asc_hstattri.records.append(asc_hstattri.create_record({
+                'DelivererID': 'SYN',
+                'ID': stop_id,
+                'AttributeID': 'GL',
+                'AttributeValue': str(platform)
+            }))
+
+            asc_tarif.records.append(asc_tarif.create_record({
+                'StationID': stop_id,
+                'DelivererID': 'SYN',
+                'Area': str(station_id % 10)
+            }))
+
+            stop_ids.append(stop_id)
+
+    # a single operator and operator organisation
+    asc_betriebe = create_asc_file('BETRIEBE.ASC')
+    asc_betriebe.records.append(asc_betriebe.create_record({'ID': 1, 'OperatorNumber': 1, 'Code': 'SYN', 'Name': 'Synthetic Operator'}))
+
+    asc_betriebsteile = create_asc_file('BETRIEBSTEILE.ASC')
+    asc_betriebsteile.records.append(asc_betriebsteile.create_record({
+        'Code': 'SYN',
+        'Name': 'Synthetic Operator',
+        'ID': 'SYN',
+        'VehicleTypeGroup': 'Bus',
+        'DelivererID': 'SYN',
+        'OperatorID': 1,
+        'OrganisationNumber': 1
+    }))
+
+    # one base version over one year and further versions restricted to a period of the year
+    base_version_start_date = datetime.strptime(start_date, '%d.%m.%Y')
+    base_version_end_date = base_version_start_date + timedelta(365)
+
+    weekdays = [(base_version_start_date + timedelta(c)).weekday() for c in range(_BITFIELD_LENGTH * 4)]
+
+    asc_bitfeld = create_asc_file('BITFELD.ASC')
+    asc_versione = create_asc_file('VERSIONE.ASC')
+
+    service_bitfield_ids = list()
+    for bitfield_id, service_weekdays in enumerate(((0, 1, 2, 3, 4, 5, 6), (0, 1, 2, 3, 4), (5, ), (6, ), (5, 6)), 1):
+        bitfield = ''.join('1' if c < 365 and weekdays[c] in service_weekdays else '0' for c in range(_BITFIELD_LENGTH * 4))
+        asc_bitfeld.records.append(asc_bitfeld.create_record({'ID': bitfield_id, 'Bitfield': _bin2hex(bitfield)}))
+
+        service_bitfield_ids.append(bitfield_id)
+
+    asc_versione.records.append(asc_versione.create_record({
+        'ID': 1,
+        'Name': 'Base',
+        'StartDate': base_version_start_date.strftime('%d.%m.%Y'),
+        'EndDate': base_version_end_date.strftime('%d.%m.%Y'),
+        'BitfieldID': ''
+    }))
+
+    for version_id in range(2, num_versions + 1):
+        bitfield_id = len(asc_bitfeld.records) + 1
+
+        first_day = (version_id - 2) * 365 // max(num_versions - 1, 1)
+        last_day = (version_id - 1) * 365 // max(num_versions - 1, 1)
+
+        bitfield = ''.join('1' if first_day <= c < last_day else '0' for c in range(_BITFIELD_LENGTH * 4))
+        asc_bitfeld.records.append(asc_bitfeld.create_record({'ID': bitfield_id, 'Bitfield': _bin2hex(bitfield)}))
+
+        asc_versione.records.append(asc_versione.create_record({
+            'ID': version_id,
+            'Name': f"Version {version_id}",
+            'StartDate': (base_version_start_date + timedelta(first_day)).strftime('%d.%m.%Y'),
+            'EndDate': (base_version_start_date + timedelta(last_day)).strftime('%d.%m.%Y'),
+            'BitfieldID': bitfield_id
+        }))
+
+    # lines are written once per line version, each line version has its own sub lines and trips
+    asc_linien = create_asc_file('LINIEN.ASC')
+
+    for line in range(1, num_lines + 1):
+        line_number = f"{line:05d}"
+
+        asc_ldxxxxxx = create_asc_file(f"LD{line_number}.ASC")
+        asc_fdxxxxxx = create_asc_file(f"FD{line_number}.ASC")
+
+        for version_id in range(1, num_versions + 1):
+            asc_linien.records.append(asc_linien.create_record({
+                'OperatorOrganisationID': 'SYN',
+                'LineNumber': line_number,
+                'Name': str(line),
+                'VehicleTypeGroup': 'Bus',
+                'InternationalLineID': f"de:syn:{line}",
+                'PseudoFlag': False,
+                'ExportNameFlag': False
+            }))
+
+            for sub_line_number in range(1, num_sub_lines + 1):
+                direction_id = str((sub_line_number - 1) % 2 + 1)
+                sub_line_stop_ids = rnd.sample(stop_ids, min(num_stops_per_sub_line, len(stop_ids)))
+
+                asc_ldxxxxxx.headers.append(asc_ldxxxxxx.create_header({
+                    'LineNumber': line_number,
+                    'LineVersionNumber': version_id,
+                    'LineVersionPriority': 1,
+                    'OperatorOrganisationID': 'SYN',
+                    'SubLineNumber': sub_line_number,
+                    'DirectionID': direction_id,
+                    'NumStops': len(sub_line_stop_ids),
+                    'NumTimeDemandTypes': num_time_demand_types,
+                    'VehicleTypeID': 'BUS',
+                    'BitfieldID': ''
+                }))
+
+                asc_ldxxxxxx.records.append([
+                    asc_ldxxxxxx.create_record({
+                        'ConsecutiveNumber': i + 1,
+                        'StopID': stop_id,
+                        'DIMENSIONS': [
+                            {
+                                'TravelTime': f"{rnd.randint(1, 5):02d}:{rnd.choice((0, 30)):02d}" if i + 1 < len(sub_line_stop_ids) else '00:00',
+                                'WaitingTime': f"00:{rnd.choice((0, 0, 30)):02d}",
+                                'NoEntry': i + 1 == len(sub_line_stop_ids),
+                                'NoExit': i == 0,
+                                'DemandStop': rnd.random() < 0.05
+                            } for _ in range(num_time_demand_types)
+                        ]
+                    }) for i, stop_id in enumerate(sub_line_stop_ids)
+                ])
+
+                asc_fdxxxxxx.headers.append(asc_fdxxxxxx.create_header({
+                    'LineNumber': line_number,
+                    'LineVersionNumber': version_id,
+                    'OperatorOrganisationID': 'SYN',
+                    'DirectionID': direction_id,
+                    'SubLineNumber': sub_line_number,
+                    'NumTrips': num_trips
+                }))
+
+                asc_fdxxxxxx.records.append([
+                    asc_fdxxxxxx.create_record({
+                        'PositionSequenceStartStop': 1,
+                        'StartStopID': sub_line_stop_ids[0],
+                        'StartTime': f"{rnd.randint(4, 23):02d}:{rnd.randint(0, 59):02d}:00",
+                        'PositionSequenceDestinationStop': len(sub_line_stop_ids),
+                        'DestinationStopID': sub_line_stop_ids[-1],
+                        'TimeDemandType': rnd.randint(1, num_time_demand_types),
+                        'ExternalTripNumber': str(trip),
+                        'NumFollowingTrips': 0,
+                        'TimeSpanFollowingTrips': '00:00',
+                        'BitfieldID': rnd.choice(service_bitfield_ids),
+                        'ID': f"{version_id}{sub_line_number:02d}{trip:04d}",
+                        'InternationalTripID': f"de:syn:{line}:{version_id}:{sub_line_number}:{trip}"
+                    }) for trip in range(1, num_trips + 1)
+                ])
+
+        asc_ldxxxxxx.write(os.path.join(output_directory, f"LD{line_number}.ASC"))
+        asc_fdxxxxxx.write(os.path.join(output_directory, f"FD{line_number}.ASC"))
+
+    for asc_file in (asc_attribut, asc_halteste, asc_hstattri, asc_tarif, asc_betriebe, asc_betriebsteile, asc_bitfeld, asc_versione, asc_linien):
+        asc_file.write(os.path.join(output_directory, os.path.basename(asc_file._filename)))
+
+def _bin2hex(bitfield):
+    return f"{int(bitfield, 2):0{_BITFIELD_LENGTH}X}"
@@ -0,0 +1,96 @@
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from isa2gtfs.asc import read_asc_file
+from isa2gtfs.converter import IsaGtfsConverter
+
+########################################################################################################################
+# Benchmark harness for reading ASC files and converting ISA datasets.
+########################################################################################################################
+
+_ASC_FILE_TYPES = ['HALTESTE', 'BETRIEBE', 'BETRIEBSTEILE', 'LINIEN', 'VERSIONE', 'BITFELD', 'LD', 'FD']
+
+# differences below this number of seconds are considered as noise
+_NOISE_FLOOR = 0.01
+
+def run_benchmarks(input_directory, repeat=3, workers=1):
+    results = dict()
+
+    # read all files of each type, LD and FD are summed up over all lines
+    results['read_asc_file'] = dict()
+    for asc_file_type in _ASC_FILE_TYPES:
+        if asc_file_type in ('LD', 'FD'):
+            filenames = sorted(glob.glob(os.path.join(input_directory, f"{asc_file_type}[0-9]*.ASC")))
+        else:
+            filenames = [os.path.join(input_directory, f"{asc_file_type}.ASC")]
+
+        logging.info(f"benchmarking read_asc_file for {asc_file_type} ({len(filenames)} files) ...")
+        results['read_asc_file'][asc_file_type] = _best_of(repeat, _read_asc_files, filenames)
+
+    # each conversion runs in a fresh process, so module level lookups of the dialect start empty
+    results['convert'] = dict()
+    for _ in range(repeat):
+        logging.info('benchmarking conversion ...')
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            stage_timings = executor.submit(_convert, input_directory, workers).result()
+
+        for stage_name, stage_seconds in stage_timings.items():
+            results['convert'][stage_name] = min(stage_seconds, results['convert'].get(stage_name, stage_seconds))
+
+    return results
+
+def compare_results(results, baseline_results, tolerance=0.25):
+    regressions = list()
+    for group_name, group_results in results.items():
+        for name, seconds in group_results.items():
+            baseline_seconds = baseline_results.get(group_name, dict()).get(name)
+            if baseline_seconds is None:
+                continue
+
+            if seconds > baseline_seconds * (1 + tolerance) and seconds - baseline_seconds > _NOISE_FLOOR:
+                regressions.append((f"{group_name}.{name}", baseline_seconds, seconds))
+
+    return regressions
+
+def load_baseline(baseline_filename):
+    with open(baseline_filename, 'r') as baseline_file:
+        return json.load(baseline_file)
+
+def save_baseline(baseline_filename, parameters, results):
+    with open(baseline_filename, 'w') as baseline_file:
+        json.dump({'parameters': parameters, 'results': results}, baseline_file, indent=4, sort_keys=True)
+
+def _best_of(repeat, func, *args):
+    best_seconds = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        seconds = time.perf_counter() - start
+
+        if best_seconds is None or seconds < best_seconds:
+            best_seconds = seconds
+
+    return best_seconds
+
+def _read_asc_files(filenames):
+    for filename in filenames:
+        read_asc_file(filename, compact=True)
+
+def _convert(input_directory, workers):
+    with tempfile.TemporaryDirectory() as output_directory:
+        converter = IsaGtfsConverter(workers=workers, use_cache=False)
+
+        start = time.perf_counter()
+        converter.convert(input_directory, output_directory)
+
+        stage_timings = {stage_name: stage_metrics['wall_time'] for stage_name, stage_metrics in converter._stage_metrics.items()}
+        stage_timings['total'] = time.perf_counter() - start
+
+    return stage_timings
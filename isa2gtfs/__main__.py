@@ -1,7 +1,11 @@
 import click
 import logging
+import sys
 
-from isa2gtfs.converter import IsaGtfsConverter
+from isa2gtfs.batch import load_manifest, run_batch
+from isa2gtfs.converter import IsaGtfsConverter, GtfsIsaConverter
+from isa2gtfs.sink import create_sink, MultiSink, ParquetSink, SqliteSink
+from isa2gtfs.watch import InboxWatcher
 
 logging.basicConfig(
     level=logging.INFO, 
@@ -13,9 +17,60 @@ logging.basicConfig(
 @click.option('--input', '-i', default='./input', help='input directory or ZIP file')
 @click.option('--output', '-o', default='./output', help='output directory or ZIP file')
 @click.option('--config', '-c', default=None, help='additional config file')
-def main(input, output, config):
-    converter = IsaGtfsConverter(config)
-    converter.convert(input, output)
+@click.option('--workers', '-w', default=1, type=int, help='number of worker processes for converting lines, in batch mode the number of jobs converted concurrently')
+@click.option('--no-cache', is_flag=True, default=False, help='do not use the cache directory for parsed ASC files')
+@click.option('--reverse', is_flag=True, default=False, help='convert GTFS input to ISA output')
+@click.option('--metrics', '-m', default=None, help='write a JSON report with timings, row counts and memory usage of each stage')
+@click.option('--batch', '-b', default=None, help='YAML manifest with input, output and config of several jobs to convert')
+@click.option('--parquet', default=None, help='directory for writing the GTFS tables as typed Parquet files in the same pass')
+@click.option('--sqlite', default=None, help='SQLite database for writing the GTFS tables as typed and indexed tables in the same pass')
+@click.option('--watch', default=None, help='inbox directory to watch for new ISA deliveries, which are converted into the output directory')
+@click.option('--interval', default=10, type=float, help='seconds between two checks of the inbox directory in watch mode')
+@click.option('--health-port', default=None, type=int, help='local port for a health and metrics HTTP endpoint in watch mode')
+def main(input, output, config, workers, no_cache, reverse, metrics, batch, parquet, sqlite, watch, interval, health_port):
+    if watch is not None:
+        watcher = InboxWatcher(watch, output, config, workers=workers, use_cache=not no_cache, interval=interval)
+        watcher.run(health_port)
+
+        return
+
+    if batch is not None:
+        results = run_batch(load_manifest(batch), workers=workers, use_cache=not no_cache)
+
+        for result in results:
+            if result['status'] == 'ok':
+                click.echo(f"{result['name']}: ok in {result['wall_time']:.2f}s, {result['rows']} rows ({result['rows_per_second']:.0f} rows/s), {result['input_size'] / 1024 / 1024:.1f} MB input ({result['bytes_per_second'] / 1024 / 1024:.2f} MB/s)")
+            else:
+                click.echo(f"{result['name']}: failed - {result['error']}")
+
+        num_failed = len([result for result in results if result['status'] != 'ok'])
+        click.echo(f"{len(results) - num_failed} of {len(results)} jobs converted successfully")
+
+        if num_failed > 0:
+            sys.exit(1)
+
+        return
+
+    if reverse:
+        converter = GtfsIsaConverter()
+        converter.convert(input, output)
+
+        return
+
+    converter = IsaGtfsConverter(config, workers=workers, use_cache=not no_cache, metrics_filename=metrics)
+
+    # typed outputs are written in the same pass as the GTFS output
+    if parquet is not None or sqlite is not None:
+        sinks = [create_sink(output)]
+        if parquet is not None:
+            sinks.append(ParquetSink(parquet))
+
+        if sqlite is not None:
+            sinks.append(SqliteSink(sqlite))
+
+        converter.convert(input, MultiSink(sinks))
+    else:
+        converter.convert(input, output)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
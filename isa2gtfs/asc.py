@@ -1,157 +1,652 @@
 import csv
+import functools
+import hashlib
+import io
+import itertools
+import mmap
 import os
+import pickle
+import zipfile
+
+from collections import namedtuple
 
 from isa2gtfs.ascdef import name2def
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 ########################################################################################################################
 # Helper class for reading and modifying *.asc files.
 ########################################################################################################################
 
-def read_asc_file(filename):
-    asc_file = AscFile()
+def resolve_asc_file(asc_input, filename):
+    # ZIP archives are only opened by an AscInput, which is closed by its owner
+    if not isinstance(asc_input, AscInput):
+        raise TypeError(f"expected AscInput, got {type(asc_input).__name__}")
+    
+    return asc_input.resolve(filename)
+    
+    
+class AscInput:
+    
+    def __init__(self, input_path):
+        self.input_path = input_path
+        
+        self._zip_file = None
+        self._zip_pid = None
+        
+    def resolve(self, filename):
+        if not self.input_path.lower().endswith('.zip'):
+            return os.path.join(self.input_path, filename)
+        
+        # the ZIP archive is opened once per process and conversion, worker processes must not share the handle of their parent
+        if self._zip_file is None or self._zip_pid != os.getpid():
+            self._zip_file = zipfile.ZipFile(self.input_path, 'r')
+            self._zip_pid = os.getpid()
+            
+        return zipfile.Path(self._zip_file, filename)
+        
+    def close(self):
+        if self._zip_file is not None and self._zip_pid == os.getpid():
+            self._zip_file.close()
+            
+        self._zip_file = None
+        self._zip_pid = None
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        
+    def __getstate__(self):
+        # open archives are not passed to other processes, they open the archive themselves
+        state = self.__dict__.copy()
+        state['_zip_file'] = None
+        state['_zip_pid'] = None
+        
+        return state
+    
+    
+def hash_asc_file(filename):
+    content_hash = hashlib.sha256()
+    
+    if isinstance(filename, str):
+        content_file = open(filename, 'rb')
+    else:
+        content_file = filename.open('rb')
+        
+    with content_file:
+        for chunk in iter(lambda: content_file.read(1024 * 1024), b''):
+            content_hash.update(chunk)
+            
+    return content_hash.hexdigest()
+    
+    
+def read_asc_file(filename, compact=False, cache=None, columns=None):
+    asc_file = AscFile(compact=compact, cache=cache, columns=columns)
     asc_file.read(filename)
     
     return asc_file
     
     
+def iter_asc_records(filename, compact=False, cache=None, columns=None):
+    asc_file = AscFile(compact=compact, cache=cache, columns=columns)
+    
+    return asc_file.iter_records(filename)
+
+
+def iter_asc_groups(filename, compact=False, cache=None, columns=None):
+    asc_file = AscFile(compact=compact, cache=cache, columns=columns)
+    
+    return asc_file.iter_groups(filename)
+    
+    
+def read_asc_table(filename):
+    asc_table = AscTable()
+    asc_table.read(filename)
+    
+    return asc_table
+    
+    
 def create_asc_file(filename):
-    asc_file = AscFile(filename)
+    asc_file = AscFile()
+    asc_file._init_definition(filename)
     
     return asc_file
 
+########################################################################################################################
+# Compact record representation, a named tuple per definition which can be accessed like a dict by column names.
+########################################################################################################################
+
+class AscRecord:
+    
+    __slots__ = ()
+    
+    _dimension_type = None
+    
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            return tuple.__getitem__(self, key)
+        
+        if key == 'DIMENSIONS' and self._dimension_type is not None:
+            return list(self.dimensions())
+            
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+            
+    def __contains__(self, key):
+        return key in self._fields
+        
+    def __reduce__(self):
+        if self._dimension_type is not None:
+            return _restore_record, (self._fields[:-1], self._dimension_type._fields, tuple(self))
+        
+        return _restore_record, (self._fields, None, tuple(self))
+    
+    def get(self, key, default=None):
+        if key in self._fields:
+            return self[key]
+            
+        return default
+    
+    def keys(self):
+        return self._fields
+        
+    def values(self):
+        return [self[k] for k in self._fields]
+        
+    def items(self):
+        return [(k, self[k]) for k in self._fields]
+    
+    def dimension(self, index):
+        dimension_size = len(self._dimension_type._fields)
+        
+        return self._dimension_type._make(self.DIMENSIONS[index * dimension_size:(index + 1) * dimension_size])
+        
+    def dimensions(self):
+        dimension_size = len(self._dimension_type._fields)
+        
+        return tuple(
+            self._dimension_type._make(self.DIMENSIONS[start:start + dimension_size])
+            for start in range(0, len(self.DIMENSIONS), dimension_size)
+        )
+
+
+_record_type_cache = dict()
+
+def _record_type(fields, dimension_fields=None):
+    cache_key = (tuple(fields), tuple(dimension_fields) if dimension_fields is not None else None)
+    if cache_key in _record_type_cache:
+        return _record_type_cache[cache_key]
+    
+    if dimension_fields is not None:
+        record_type = type('AscRecord', (AscRecord, namedtuple('AscRecordBase', list(fields) + ['DIMENSIONS'])), {
+            '__slots__': (),
+            '_dimension_type': _record_type(dimension_fields)
+        })
+    else:
+        record_type = type('AscRecord', (AscRecord, namedtuple('AscRecordBase', fields)), {
+            '__slots__': ()
+        })
+    
+    _record_type_cache[cache_key] = record_type
+    
+    return record_type
+    
+def _restore_record(fields, dimension_fields, values):
+    return _record_type(fields, dimension_fields)._make(values)
+    
+
+def _basename(filename):
+    if isinstance(filename, str):
+        return os.path.basename(filename)
+        
+    return filename.name
+    
+
+_READ_BATCH_SIZE = 10000
+
+_decoder_cache = dict()
+
+def _compile_decoder(definition, repeat_from=None, compact=False, columns=None):
+    cache_key = (id(definition), repeat_from, compact, tuple(columns) if columns is not None else None)
+    if cache_key in _decoder_cache:
+        return _decoder_cache[cache_key]
+    
+    keys = tuple(def_obj[0] for def_obj in definition)
+    converters = tuple(_compile_column_converter(def_obj[0], def_obj[1], def_obj[3]) for def_obj in definition)
+    
+    num_columns = len(definition)
+    
+    # only the requested columns are converted, the others are skipped
+    if columns is not None:
+        unknown_columns = [column for column in columns if column not in keys]
+        if len(unknown_columns) > 0:
+            raise ValueError(f"unknown columns {', '.join(unknown_columns)}")
+            
+        selected = tuple(index for index, key in enumerate(keys) if key in columns)
+    else:
+        selected = tuple(range(num_columns))
+    
+    if repeat_from is not None:
+        dimensions_index = keys.index(repeat_from)
+        
+        # files with dimensions are decoded like files without dimensions if no repeated column is requested
+        if not any(index >= dimensions_index for index in selected):
+            repeat_from = None
+    
+    # rows are decoded in batches column by column, so the converters are mapped over whole columns
+    if repeat_from is None:
+        static_keys = tuple(keys[index] for index in selected)
+        static_converters = tuple((index, converters[index]) for index in selected)
+        
+        dimension_keys = None
+        dimension_converters = ()
+        
+        dimensions_index = num_columns
+        dimension_size = 0
+    else:
+        # all columns starting at repeat_from are repeated once per dimension
+        dimension_size = num_columns - dimensions_index
+        
+        static_keys = tuple(keys[index] for index in selected if index < dimensions_index)
+        static_converters = tuple((index, converters[index]) for index in selected if index < dimensions_index)
+        
+        dimension_keys = tuple(keys[index] for index in selected if index >= dimensions_index)
+        dimension_converters = tuple((index - dimensions_index, converters[index]) for index in selected if index >= dimensions_index)
+    
+    if compact:
+        record_type = _record_type(static_keys, dimension_keys)
+        create_record = functools.partial(tuple.__new__, record_type)
+    
+    def decoder(rows, num_dimensions=0):
+        if len(rows) == 0:
+            return list()
+        
+        min_columns = dimensions_index + dimension_size * num_dimensions if repeat_from is not None else num_columns
+        if min(map(len, rows)) < min_columns:
+            raise ValueError(f"row must contain at least {min_columns} columns")
+        
+        row_columns = list(zip(*rows))
+        
+        static_values = [c(row_columns[i]) for i, c in static_converters]
+        
+        if repeat_from is not None:
+            # the DIMENSIONS block of each row is one flat tuple in compact records and a list of dicts otherwise
+            dimension_values = zip(*[
+                c(row_columns[start + i])
+                for start in range(dimensions_index, dimensions_index + dimension_size * num_dimensions, dimension_size)
+                for i, c in dimension_converters
+            ])
+            
+            if not compact:
+                num_dimension_columns = len(dimension_keys)
+                dimension_values = (
+                    [dict(zip(dimension_keys, values[start:start + num_dimension_columns])) for start in range(0, len(values), num_dimension_columns)]
+                    for values in dimension_values
+                )
+            
+            # rows without any dimension get an empty DIMENSIONS block
+            if num_dimensions == 0:
+                dimension_values = (() if compact else list() for _ in rows)
+            
+            static_values.append(dimension_values)
+        
+        if compact:
+            return list(map(create_record, zip(*static_values)))
+        elif repeat_from is not None:
+            return [dict(zip(static_keys + ('DIMENSIONS', ), values)) for values in zip(*static_values)]
+        else:
+            return [dict(zip(static_keys, values)) for values in zip(*static_values)]
+    
+    _decoder_cache[cache_key] = decoder
+    
+    return decoder
+
+def _compile_column_converter(key, dtype, optional):
+    # optional text columns are decoded and stripped by builtins only, all other columns are converted value by value
+    if dtype == str and optional:
+        return lambda column: map(str.strip, map(bytes.decode, column, itertools.repeat('ISO-8859-1')))
+        
+    return functools.partial(map, _compile_converter(key, dtype, optional))
+
+def _compile_converter(key, dtype, optional):
+    # fields are passed as bytes, only text fields are decoded
+    if dtype == str:
+        if optional:
+            def converter(val):
+                return val.decode('ISO-8859-1').strip()
+        else:
+            def converter(val):
+                val = val.decode('ISO-8859-1').strip()
+                if val == '':
+                    raise ValueError(f"column {key} must not be empty")
+                    
+                return val
+    elif dtype == int or dtype == float:
+        if not optional:
+            return dtype
+            
+        def converter(val):
+            val = val.strip()
+            
+            return dtype(val) if not val == b'' else ''
+    elif dtype == bool:
+        def converter(val):
+            val = val.strip()
+            if not optional and val == b'':
+                raise ValueError(f"column {key} must not be empty")
+                
+            return val == b'1'
+    
+    return converter
+
+def _split_rows(asc_lines):
+    quoted_lines = None
+    
+    for asc_line in asc_lines:
+        # lines with quotes are parsed by the csv module, until all quoted fields are closed
+        if quoted_lines is not None:
+            quoted_lines.append(asc_line)
+            num_quotes = num_quotes + asc_line.count(b'"')
+            
+            if num_quotes % 2 == 0:
+                yield from _split_quoted_rows(b''.join(quoted_lines))
+                quoted_lines = None
+        elif b'"' in asc_line:
+            num_quotes = asc_line.count(b'"')
+            
+            if num_quotes % 2 == 0:
+                yield from _split_quoted_rows(asc_line)
+            else:
+                quoted_lines = [asc_line]
+        else:
+            asc_line = asc_line.rstrip(b'\r\n')
+            if not asc_line == b'':
+                yield asc_line.split(b'#')
+    
+    if quoted_lines is not None:
+        yield from _split_quoted_rows(b''.join(quoted_lines))
+
+def _split_quoted_rows(asc_data):
+    asc_reader = csv.reader(io.StringIO(asc_data.decode('ISO-8859-1'), newline=''), delimiter='#', quotechar='"')
+    
+    for asc_row in asc_reader:
+        if len(asc_row) > 0:
+            yield [field.encode('ISO-8859-1') for field in asc_row]
+
+_WRITE_BATCH_SIZE = 10000
+
+_encoder_cache = dict()
+
+def _compile_encoder(definition, repeat_from=None):
+    cache_key = (id(definition), repeat_from)
+    if cache_key in _encoder_cache:
+        return _encoder_cache[cache_key]
+    
+    keys = tuple(def_obj[0] for def_obj in definition)
+    formatters = tuple(_compile_formatter(def_obj[1], def_obj[2]) for def_obj in definition)
+    
+    if repeat_from is None:
+        def encoder(record):
+            return [f(record[k]) for k, f in zip(keys, formatters)]
+    else:
+        # all columns starting at repeat_from are written once per dimension
+        dimensions_index = keys.index(repeat_from)
+        
+        static_keys = keys[:dimensions_index]
+        static_formatters = formatters[:dimensions_index]
+        
+        dimension_keys = keys[dimensions_index:]
+        dimension_formatters = formatters[dimensions_index:]
+        
+        def encoder(record):
+            values = [f(record[k]) for k, f in zip(static_keys, static_formatters)]
+            
+            if isinstance(record, AscRecord):
+                # compact records store the DIMENSIONS block as one flat tuple
+                values.extend(
+                    f(v) 
+                    for f, v in zip(dimension_formatters * (len(record.DIMENSIONS) // len(dimension_formatters)), record.DIMENSIONS)
+                )
+            else:
+                for dimension in record['DIMENSIONS']:
+                    values.extend(f(dimension[k]) for k, f in zip(dimension_keys, dimension_formatters))
+            
+            return values
+    
+    _encoder_cache[cache_key] = encoder
+    
+    return encoder
+
+def _compile_formatter(dtype, dlen):
+    if dtype == bool:
+        def formatter(val):
+            return '1' if val == True else '0'
+    elif dtype == int or dtype == float:
+        def formatter(val):
+            val = str(val)
+            
+            return val.rjust(dlen, ' ') if not val == '' else val
+    else:
+        def formatter(val):
+            val = str(val)
+            
+            return val.ljust(dlen, ' ') if not val == '' else val
+    
+    return formatter
+
 class AscFile:
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, compact=False, cache=None, columns=None):
         self.null_value = 'NULL'
         self.strict = False
+        self.compact = compact
+        self.cache = cache
+        self.selected_columns = columns
         
         self._internal_init()
 
     def read(self, filename):
-        self._filename = filename
-        self._definition = name2def(os.path.basename(filename))
+        self._indexes = dict()
+        self._header_indexes = dict()
         
-        if self._definition is None:
-            pass
-            
-        if 'DIMENSIONS' in self._definition:
-            self._dimensions = {
-                'NUM_DIMENSIONS': 0, 
-                'REPEAT_FROM': self._definition['DIMENSIONS']['REPEAT_FROM']
-            }
+        self._init_definition(filename)
+        
+        if 'HEADER' in self._definition:
+            for header, record_group in self.iter_groups(filename):
+                self.headers.append(header)
+                self.records.append(record_group)
         else:
-            self._dimensions = None        
+            for record in self.iter_records(filename):
+                self.records.append(record)
     
-        with open(self._filename, newline='', encoding='ISO-8859-1') as asc_file:
-            asc_reader = csv.reader(asc_file, delimiter='#', quotechar='"')
+    def iter_records(self, filename):
+        self._init_definition(filename)
+        
+        if 'HEADER' in self._definition:
+            raise ValueError(f"{_basename(filename)} contains headers, use iter_groups instead")
+        
+        yield from self._iter_cached(self._parse_records)
+    
+    def iter_groups(self, filename):
+        self._init_definition(filename)
+        
+        if 'HEADER' not in self._definition:
+            raise ValueError(f"{_basename(filename)} contains no headers, use iter_records instead")
+        
+        yield from self._iter_cached(self._parse_groups)
+        
+    def _iter_cached(self, parse):
+        if self.cache is None:
+            yield from parse()
+            return
+        
+        cache_key = self.cache.create_key(self._filename, self._definition, self.compact, self.selected_columns)
+        
+        cached_items = self.cache.load(cache_key)
+        if cached_items is not None:
+            yield from cached_items
+            return
+        
+        # parse the file and store the result only if it was read completely
+        parsed_items = list()
+        for item in parse():
+            parsed_items.append(item)
+            yield item
             
-            ptr_header = 0
-            lst_record_group = None
+        self.cache.store(cache_key, parsed_items)
+        
+    def _parse_records(self):
+        data_decoder = _compile_decoder(self._definition['DATA'], compact=self.compact, columns=self.selected_columns)
+        
+        asc_rows = self._iter_rows()
+        for asc_row_batch in iter(lambda: list(itertools.islice(asc_rows, _READ_BATCH_SIZE)), []):
+            yield from data_decoder(asc_row_batch)
+    
+    def _parse_groups(self):
+        header_decoder = _compile_decoder(self._definition['HEADER'], compact=self.compact)
+        
+        if self._dimensions is not None:
+            data_decoder = _compile_decoder(self._definition['DATA'], self._dimensions['REPEAT_FROM'], self.compact, self.selected_columns)
+        else:
+            data_decoder = _compile_decoder(self._definition['DATA'], compact=self.compact, columns=self.selected_columns)
+        
+        num_dimensions = 0
+        
+        asc_rows = self._iter_rows()
+        for asc_header_row in asc_rows:
+            header = header_decoder([asc_header_row])[0]
             
-            for index, asc_row in enumerate(asc_reader):
-                if 'HEADER' in self._definition:
-                    if index == ptr_header:
-                        
-                        # add last record group if available
-                        if lst_record_group is not None:
-                            self.records.append(lst_record_group)
-                        
-                        lst_record_group = list()
-                        
-                        # read header entry
-                        entry = self._read_entry(asc_row, self._definition['HEADER'])
-                        self.headers.append(entry)
-                        
-                        # check whether we're monitoring dimensions and update number of dimensions for the next subset
-                        if self._dimensions is not None:
-                            self._dimensions['NUM_DIMENSIONS'] = entry[self._definition['DIMENSIONS']['INDICATOR']]
-                        
-                        # set next header pointer value
-                        ptr_header = ptr_header + entry[self._definition['INCREMENTOR']] + 1
-                    else:
-                        # add record only to record group
-                        lst_record_group.append(
-                            self._read_entry(asc_row, self._definition['DATA'], self._dimensions)
-                        )
-                else:
-                    # there's no header handling, simply add the record
-                    self.records.append(
-                        self._read_entry(asc_row, self._definition['DATA'])
-                    )
-            
-            # if there were headers handled, add the last remaining record group
-            if lst_record_group is not None:
-                self.records.append(lst_record_group)
-                    
+            # check whether we're monitoring dimensions and update number of dimensions for the next subset
+            if self._dimensions is not None:
+                num_dimensions = header[self._definition['DIMENSIONS']['INDICATOR']]
+                self._dimensions['NUM_DIMENSIONS'] = num_dimensions
+            
+            # the header is followed by the number of records given by the incrementor
+            asc_record_rows = list(itertools.islice(asc_rows, header[self._definition['INCREMENTOR']]))
+            
+            yield header, data_decoder(asc_record_rows, num_dimensions)
                         
     def write(self, filename=None):
         if filename == None:
             filename = self._filename
     
-        with open(filename, 'w', newline='', encoding='ISO-8859-1') as asc_file:
-            asc_writer = csv.writer(asc_file, delimiter='#', quotechar='"', lineterminator='#\n')
+        with open(filename, 'w', newline='', encoding='ISO-8859-1', errors='replace') as asc_file:
+            self.write_stream(asc_file)
             
-            if len(self.headers) > 0:
-                for index, header in enumerate(self.headers):                
-                    asc_headers = list()
-                    for header_key, header_value in header.items():
-                        def_dtype = self._definition['HEADER'][list(header.keys()).index(header_key)][1]
-                        def_dlen = self._definition['HEADER'][list(header.keys()).index(header_key)][2]
-                        
-                        asc_headers.append(self._create_value(header_value, def_dtype, def_dlen))
-                    
-                    asc_writer.writerow(asc_headers)
+    def write_stream(self, asc_file):
+        asc_writer = csv.writer(asc_file, delimiter='#', quotechar='"', lineterminator='#\n')
+        
+        if len(self.headers) > 0:
+            header_encoder = _compile_encoder(self._definition['HEADER'])
+            record_encoder = _compile_encoder(self._definition['DATA'], self._dimensions['REPEAT_FROM'] if self._dimensions is not None else None)
+            
+            asc_rows = list()
+            for header, record_group in zip(self.headers, self.records):
+                asc_rows.append(header_encoder(header))
+                asc_rows.extend(map(record_encoder, record_group))
                 
-                    for record in self.records[index]:
-                        asc_values = list()
-                        for record_key, record_value in record.items():
-                            if record_key == 'DIMENSIONS':
-                                for dimension in record_value:
-                                    for dimension_key, dimension_value in dimension.items():
-                                        index = next((i for i, item in enumerate(self._definition['DATA']) if item[0] == dimension_key), -1)
-                                        def_dtype = self._definition['DATA'][index][1]
-                                        def_dlen = self._definition['DATA'][index][2]
-                                        
-                                        asc_values.append(self._create_value(dimension_value, def_dtype, def_dlen))
-                            else:
-                                def_dtype = self._definition['DATA'][list(record.keys()).index(record_key)][1]
-                                def_dlen = self._definition['DATA'][list(record.keys()).index(record_key)][2]
-                                
-                                asc_values.append(self._create_value(record_value, def_dtype, def_dlen))
-                        
-                        asc_writer.writerow(asc_values)               
-            else:
-                for record in self.records:
-                    asc_values = list()
-                    for record_key, record_value in record.items():
-                        def_dtype = self._definition['DATA'][list(record.keys()).index(record_key)][1]
-                        def_dlen = self._definition['DATA'][list(record.keys()).index(record_key)][2]
-                        
-                        asc_values.append(self._create_value(record_value, def_dtype, def_dlen))
-                    
-                    asc_writer.writerow(asc_values)  
+                if len(asc_rows) >= _WRITE_BATCH_SIZE:
+                    asc_writer.writerows(asc_rows)
+                    asc_rows = list()
+            
+            asc_writer.writerows(asc_rows)
+        else:
+            record_encoder = _compile_encoder(self._definition['DATA'])
+            
+            for start in range(0, len(self.records), _WRITE_BATCH_SIZE):
+                asc_writer.writerows(map(record_encoder, self.records[start:start + _WRITE_BATCH_SIZE]))
             
     def find_header(self, hdata, primary_key, foreign_key):
-        header_pkfields = self._create_compare_record(hdata, primary_key)
+        if primary_key is None or foreign_key is None:
+            header_pkfields = self._create_compare_record(hdata, primary_key)
 
-        for index, header in enumerate(self.headers):
-            compare_header = self._create_compare_record(header, foreign_key)
+            for index, header in enumerate(self.headers):
+                compare_header = self._create_compare_record(header, foreign_key)
 
-            if set(header_pkfields.values()) == set(compare_header.values()):
-                return index, header
+                if set(header_pkfields.values()) == set(compare_header.values()):
+                    return index, header
+                
+            return -1, None
+        
+        # lookup the header by the hash index of the foreign key columns
+        header_index = self.create_header_index(foreign_key)
+        
+        return header_index.get(tuple(hdata[k] for k in primary_key), (-1, None))
+    
+    def find_record_group(self, hdata, primary_key, foreign_key):
+        index, header = self.find_header(hdata, primary_key, foreign_key)
+        if index < 0:
+            return None, None
+        
+        return header, self.records[index]
+    
+    def create_header_index(self, key_columns):
+        key_columns = tuple(key_columns)
+        
+        if key_columns not in self._header_indexes:
+            header_index = dict()
+            for index, header in enumerate(self.headers):
+                # keep the first matching header, just like a linear scan would do
+                header_index.setdefault(tuple(header[k] for k in key_columns), (index, header))
+            
+            self._header_indexes[key_columns] = header_index
             
-        return -1, None
+        return self._header_indexes[key_columns]
     
     def find_record(self, rdata, primary_key, foreign_key):
-        record_pkfields = self._create_compare_record(rdata, primary_key)
+        if primary_key is None or foreign_key is None:
+            record_pkfields = self._create_compare_record(rdata, primary_key)
+            
+            for record in self.records:
+                compare_record = self._create_compare_record(record, foreign_key)
+                if set(record_pkfields.values()) == set(compare_record.values()):
+                    return record
+                    
+            return None
         
-        for record in self.records:
-            compare_record = self._create_compare_record(record, foreign_key)
-            if set(record_pkfields.values()) == set(compare_record.values()):
-                return record
-                
-        return None
+        # lookup the record by the hash index of the foreign key columns
+        record_index = self.create_index(foreign_key)
+        
+        return record_index.get(tuple(rdata[k] for k in primary_key))
+    
+    def create_index(self, key_columns):
+        key_columns = tuple(key_columns)
+        
+        if key_columns not in self._indexes:
+            record_index = dict()
+            for record in self.records:
+                # keep the first matching record, just like a linear scan would do
+                record_index.setdefault(tuple(record[k] for k in key_columns), record)
+            
+            self._indexes[key_columns] = record_index
+            
+        return self._indexes[key_columns]
     
+    def create_header(self, values):
+        header = {def_obj[0]: '' for def_obj in self._definition['HEADER']}
+        header.update(values)
+        
+        return header
+        
+    def create_record(self, values):
+        keys = [def_obj[0] for def_obj in self._definition['DATA']]
+        
+        # repeated columns are passed as list of dicts in DIMENSIONS
+        if self._dimensions is not None:
+            keys = keys[:keys.index(self._dimensions['REPEAT_FROM'])]
+        
+        record = {key: '' for key in keys}
+        record.update(values)
+        
+        return record
+        
     def add_record(self, rdata, primary_key=None):
         """record_existing = False
         record_pkfields = self._create_compare_record(rdata, primary_key)
@@ -176,22 +671,63 @@ class AscFile:
         self.records = updated_records"""
             
     def replace_foreign_keys(self, foreign_key_columns, repl_map):
-        for i in range(len(self.records)):
-            original_record = self.records[i]
-            updated_record = dict(original_record)
-            
-            updated = False
-            for fkc in foreign_key_columns:
-                if original_record[fkc] in repl_map:
-                    updated_record[fkc] = repl_map[original_record[fkc]]
-                    updated = True
-                    
-            if updated:
-                self.records[i] = updated_record
+        # records of files with headers are replaced within their record groups
+        if len(self.headers) > 0:
+            record_lists = self.records
+        else:
+            record_lists = [self.records]
+        
+        for records in record_lists:
+            for i in range(len(records)):
+                original_record = records[i]
+                
+                updated_values = dict()
+                for fkc in foreign_key_columns:
+                    if original_record[fkc] in repl_map:
+                        updated_values[fkc] = repl_map[original_record[fkc]]
+                        
+                if len(updated_values) > 0:
+                    if isinstance(original_record, AscRecord):
+                        records[i] = original_record._replace(**updated_values)
+                    else:
+                        records[i] = {**original_record, **updated_values}
+        
+        # updated records are new objects, so all cached indexes need to be rebuilt
+        for key_columns in list(self._indexes.keys()):
+            del self._indexes[key_columns]
+            self.create_index(key_columns)
             
     def close(self):
         self._internal_init()
         
+    def _init_definition(self, filename):
+        self._filename = filename
+        self._definition = name2def(_basename(filename))
+        
+        if self._definition is None:
+            raise ValueError(f"no definition found for {_basename(filename)}")
+            
+        if 'DIMENSIONS' in self._definition:
+            self._dimensions = {
+                'NUM_DIMENSIONS': 0, 
+                'REPEAT_FROM': self._definition['DIMENSIONS']['REPEAT_FROM']
+            }
+        else:
+            self._dimensions = None
+    
+    def _iter_rows(self):
+        # the file is memory-mapped and split into lines and fields as bytes without the csv module, only the requested columns are decoded
+        if isinstance(self._filename, str):
+            with open(self._filename, 'rb') as asc_file:
+                if os.fstat(asc_file.fileno()).st_size == 0:
+                    return
+                    
+                with mmap.mmap(asc_file.fileno(), 0, access=mmap.ACCESS_READ) as asc_data:
+                    yield from _split_rows(iter(asc_data.readline, b''))
+        else:
+            with self._filename.open('rb') as asc_file:
+                yield from _split_rows(asc_file)
+        
     def _internal_init(self):
         
         self._filename = None
@@ -199,88 +735,354 @@ class AscFile:
         
         self.headers = list()
         self.records = list()
-                          
+        
+        self._indexes = dict()
+        self._header_indexes = dict()
+
+    def __getstate__(self):
+        # members of ZIP archives hold the open archive, other processes only get the member name
+        state = self.__dict__.copy()
+        if state['_filename'] is not None and not isinstance(state['_filename'], str):
+            state['_filename'] = _basename(state['_filename'])
+
+        return state
+
+
+    def _create_compare_record(self, record, primary_key):
+        if primary_key is not None:
+            compare_record = dict(record)
+            for k in record.keys():
+                if k not in primary_key:
+                    del compare_record[k]
+                        
+            return compare_record
+        else:
+            return record
+
+
+########################################################################################################################
+# Persistent cache for parsed *.asc files.
+########################################################################################################################
+
+_CACHE_FORMAT_VERSION = 1
+
+class AscCache:
+
+    def __init__(self, directory, max_size=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        
+        os.makedirs(self.directory, exist_ok=True)
+        
+    def create_key(self, filename, definition, compact=False, columns=None):
+        return _create_cache_key(filename, definition, compact, columns)
+        
+    def load(self, key):
+        cache_filename = os.path.join(self.directory, f"{key}.pickle")
+        
+        try:
+            with open(cache_filename, 'rb') as cache_file:
+                data = pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        
+        # mark entry as recently used, the entry might have been evicted by another process in the meantime
+        try:
+            os.utime(cache_filename)
+        except OSError:
+            pass
+        
+        return data
+        
+    def store(self, key, data):
+        cache_filename = os.path.join(self.directory, f"{key}.pickle")
+        temp_filename = f"{cache_filename}.{os.getpid()}.tmp"
+        
+        with open(temp_filename, 'wb') as cache_file:
+            pickle.dump(data, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            
+        os.replace(temp_filename, cache_filename)
+        
+        self._evict()
+        
+    def _evict(self):
+        cache_entries = list()
+        for cache_filename in os.listdir(self.directory):
+            if not cache_filename.endswith('.pickle'):
+                continue
+                
+            try:
+                cache_stat = os.stat(os.path.join(self.directory, cache_filename))
+            except OSError:
+                continue
+                
+            cache_entries.append((cache_stat.st_mtime, cache_stat.st_size, cache_filename))
             
-    def _create_value(self, val, dtype=str, dlen=0):            
-        if dtype == bool:
-            value = '1' if val == True else '0'
+        # remove least recently used entries until the cache fits into its size limit
+        cache_size = sum(e[1] for e in cache_entries)
+        for _, entry_size, cache_filename in sorted(cache_entries):
+            if cache_size <= self.max_size:
+                break
+                
+            try:
+                os.remove(os.path.join(self.directory, cache_filename))
+            except OSError:
+                pass
+                
+            cache_size = cache_size - entry_size
+
+
+class AscMemoryCache:
+
+    def __init__(self, filenames, max_entries=64, fallback=None):
+        self.filenames = set(filename.upper() for filename in filenames)
+        self.max_entries = max_entries
+        self.fallback = fallback
+        
+        self.hits = 0
+        self.misses = 0
+        
+        self._entries = dict()
+        
+    def create_key(self, filename, definition, compact=False, columns=None):
+        # only the given files are kept in memory, all others are passed to the fallback cache
+        if _basename(filename).upper() in self.filenames:
+            return (True, _create_cache_key(filename, definition, compact, columns))
+        elif self.fallback is not None:
+            return (False, self.fallback.create_key(filename, definition, compact, columns))
         else:
-            value = str(val)
+            return (False, None)
         
-        if not value == '':
-            if dtype == int or dtype == float:
-                value = value.rjust(dlen, ' ')
-            else:
-                value = value.ljust(dlen, ' ')
+    def load(self, key):
+        in_memory, key = key
+        
+        if not in_memory:
+            return self.fallback.load(key) if self.fallback is not None else None
+        
+        data = self._entries.pop(key, None)
+        if data is None:
+            self.misses = self.misses + 1
+            return None
+        
+        # mark entry as recently used
+        self._entries[key] = data
+        self.hits = self.hits + 1
+        
+        return data
+        
+    def store(self, key, data):
+        in_memory, key = key
+        
+        if not in_memory:
+            if self.fallback is not None:
+                self.fallback.store(key, data)
             
-        return value
+            return
+        
+        self._entries[key] = data
+        
+        # remove least recently used entries, entries of changed files are never hit again and are removed first
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+    
+    def __len__(self):
+        return len(self._entries)
+        
+    def __getstate__(self):
+        # worker processes only read files which are not kept in memory, so the entries are not sent to them
+        state = self.__dict__.copy()
+        state['_entries'] = dict()
+        
+        return state
+        
+        
+def _create_cache_key(filename, definition, compact=False, columns=None):
+    key_hash = hashlib.sha256()
+    
+    # the key covers the file content, the definition used for parsing and the record representation
+    key_hash.update(f"{_CACHE_FORMAT_VERSION}:{repr(definition)}:{compact}:".encode('utf-8'))
+    if columns is not None:
+        key_hash.update(f"{sorted(columns)}:".encode('utf-8'))
+    key_hash.update(hash_asc_file(filename).encode('utf-8'))
             
+    return key_hash.hexdigest()
+
+
+########################################################################################################################
+# Columnar representation of *.asc files backed by NumPy arrays.
+########################################################################################################################
+
+# columns holding bitfields as hex digits
+_HEX_COLUMNS = ['Bitfield']
+
+class AscTable:
 
-    def _read_entry(self, row_data, definition, dimensions=None):
-        entry = dict()
+    # only reading rows is shared with AscFile, the record based API is not available for tables
+    _init_definition = AscFile._init_definition
+    _iter_rows = AscFile._iter_rows
+    
+    __getstate__ = AscFile.__getstate__
+
+    def __init__(self, filename=None):
+        self._filename = None
+        self._definition = None
+        self._dimensions = None
         
-        if dimensions is not None:
-            dimensions_index = [i for i, k in enumerate(definition) if k[0] == dimensions['REPEAT_FROM']][0]
-            dimension_size = len(definition) - dimensions_index     
+        self.columns = dict()
+        self.nulls = dict()
         
-        for index, def_obj in enumerate(definition):
-                def_key = def_obj[0]
-                def_dtype = def_obj[1]
-                def_optional = def_obj[3]
-                
-                if dimensions is not None and index >= dimensions_index:
-                    if 'DIMENSIONS' not in entry:
-                        entry['DIMENSIONS'] = list()
-                        
-                    for d in range(0, dimensions['NUM_DIMENSIONS']):
-                        if len(entry['DIMENSIONS']) <= d:
-                            entry['DIMENSIONS'].append(dict())
-                            
-                        entry['DIMENSIONS'][d][def_key] = self._read_value(
-                            row_data[index + dimension_size * d],
-                            def_dtype,
-                            def_optional
-                        )
+        self.header_columns = dict()
+        self.header_nulls = dict()
+        
+        self.offsets = None
+        
+    def read(self, filename):
+        if numpy is None:
+            raise ImportError('reading ASC files column-wise requires NumPy')
+        
+        self._init_definition(filename)
+        
+        data_definition = self._definition['DATA']
+        
+        if 'HEADER' in self._definition:
+            header_definition = self._definition['HEADER']
+            
+            incrementor_index = [d[0] for d in header_definition].index(self._definition['INCREMENTOR'])
+            if self._dimensions is not None:
+                indicator_index = [d[0] for d in header_definition].index(self._definition['DIMENSIONS']['INDICATOR'])
+            
+            header_rows = list()
+            data_rows = list()
+            data_dimensions = list()
+            offsets = list()
+            
+            ptr_header = 0
+            num_dimensions = 0
+            
+            for index, asc_row in enumerate(self._iter_rows()):
+                if index == ptr_header:
+                    header_rows.append(asc_row)
+                    offsets.append(len(data_rows))
+                    
+                    if self._dimensions is not None:
+                        num_dimensions = int(asc_row[indicator_index])
+                    
+                    ptr_header = ptr_header + int(asc_row[incrementor_index]) + 1
                 else:
-                    entry[def_key] = self._read_value(row_data[index], def_dtype, def_optional)
+                    data_rows.append(asc_row)
+                    data_dimensions.append(num_dimensions)
+                    
+            offsets.append(len(data_rows))
             
-        return entry
+            self.header_columns, self.header_nulls = self._create_columns(header_rows, header_definition)
+            self.offsets = numpy.array(offsets, dtype=numpy.int64)
+        else:
+            data_rows = list(self._iter_rows())
+            data_dimensions = None
         
-    def _read_value(self, val, dtype, optional):
-        val = val.strip()
+        self.columns, self.nulls = self._create_columns(data_rows, data_definition, data_dimensions)
         
-        if dtype == str:
-            if not optional and val == '':
-                raise ValueError(f"column must not be empty")
+    def __len__(self):
+        if len(self.columns) == 0:
+            return 0
             
-            return val
-        elif dtype == int:
-            if optional and not val == '':
-                return int(val)
-            elif optional and val == '':
-                return val
-            elif not optional:
-                return int(val)
+        return len(next(iter(self.columns.values())))
+    
+    def num_groups(self):
+        return len(self.offsets) - 1 if self.offsets is not None else 0
+    
+    def group(self, index):
+        return slice(int(self.offsets[index]), int(self.offsets[index + 1]))
+        
+    def lookup(self, column, values, header=False):
+        # vectorized join: returns the index of the first row matching each value or -1
+        key_column = self.header_columns[column] if header else self.columns[column]
+        
+        if key_column.dtype.kind == 'S':
+            values = [v.encode('ISO-8859-1') if isinstance(v, str) else v for v in values]
+            
+        values = numpy.asarray(values)
+        
+        if len(key_column) == 0:
+            return numpy.full(len(values), -1, dtype=numpy.int64)
+        
+        sort_order = numpy.argsort(key_column, kind='stable')
+        sorted_keys = key_column[sort_order]
+        
+        positions = numpy.searchsorted(sorted_keys, values)
+        positions[positions >= len(sorted_keys)] = 0
+        
+        return numpy.where(sorted_keys[positions] == values, sort_order[positions], -1)
+        
+    def _create_columns(self, rows, definition, dimensions=None):
+        columns = dict()
+        nulls = dict()
+        
+        keys = [d[0] for d in definition]
+        
+        if dimensions is not None and self._dimensions is not None:
+            dimensions_index = keys.index(self._dimensions['REPEAT_FROM'])
+            dimension_size = len(definition) - dimensions_index
+            
+            dimensions = numpy.array(dimensions, dtype=numpy.int64)
+            max_dimensions = int(dimensions.max()) if len(dimensions) > 0 else 0
+        else:
+            dimensions_index = len(definition)
+            
+        for index, def_obj in enumerate(definition):
+            def_key, def_dtype, def_dlen, def_optional = def_obj
+            
+            if index < dimensions_index:
+                values = [row[index].strip() for row in rows]
+                columns[def_key], nulls[def_key] = self._create_column(values, def_key, def_dtype, def_optional)
+            else:
+                # repeated columns become 2-dimensional arrays with one column per dimension
+                dimension_columns = list()
+                dimension_nulls = list()
+                
+                for d in range(0, max_dimensions):
+                    column_index = index + dimension_size * d
+                    
+                    values = [row[column_index].strip() if d < n else b'' for row, n in zip(rows, dimensions.tolist())]
+                    column, column_nulls = self._create_column(values, def_key, def_dtype, True)
+                    
+                    dimension_columns.append(column)
+                    dimension_nulls.append(column_nulls)
+                
+                if max_dimensions > 0:
+                    columns[def_key] = numpy.stack(dimension_columns, axis=1)
+                    nulls[def_key] = numpy.stack(dimension_nulls, axis=1)
+                else:
+                    columns[def_key] = numpy.empty((len(rows), 0))
+                    nulls[def_key] = numpy.empty((len(rows), 0), dtype=bool)
+                
+        return columns, nulls
+        
+    def _create_column(self, values, key, dtype, optional):
+        column_nulls = numpy.array([v == b'' for v in values], dtype=bool)
+        
+        if not optional and column_nulls.any():
+            raise ValueError(f"column {key} must not be empty")
+        
+        if dtype == int:
+            column = numpy.array([int(v) if not v == b'' else 0 for v in values], dtype=numpy.int64)
         elif dtype == float:
-            if optional and not val == '':
-                return float(val)
-            elif optional and val == '':
-                return val
-            elif not optional:
-                return float(val)
+            column = numpy.array([float(v) if not v == b'' else numpy.nan for v in values], dtype=numpy.float64)
         elif dtype == bool:
-            if not optional and val == '':
-                raise ValueError(f"column {def_key} must not be empty")
-                
-            return True if val == '1' else False
-
-    def _create_compare_record(self, record, primary_key):
-        if primary_key is not None:
-            compare_record = dict(record)
-            for k in record:
-                if k not in primary_key:
-                    del compare_record[k]
-                        
-            return compare_record
+            column = numpy.array([v == b'1' for v in values], dtype=bool)
+        elif key in _HEX_COLUMNS:
+            column = self._create_hex_column(values)
         else:
-            return record
+            # text is kept as ISO-8859-1 bytes as wide as the longest value instead of 4 bytes per character of the definition
+            column = numpy.array(values, dtype=bytes)
+            
+        return column, column_nulls
+        
+    def _create_hex_column(self, values):
+        # bitfields are decoded into a 2-dimensional array with one byte per 8 days, padded with inactive days
+        num_digits = max((len(v) for v in values), default=0)
+        num_digits = num_digits + num_digits % 2
+        
+        column = numpy.frombuffer(bytearray(b''.join(bytes.fromhex(v.ljust(num_digits, b'0').decode('ISO-8859-1')) for v in values)), dtype=numpy.uint8)
+        
+        return column.reshape(len(values), num_digits // 2)
@@ -0,0 +1,136 @@
+import logging
+import os
+import time
+import yaml
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from isa2gtfs.converter import IsaGtfsConverter, load_config, compile_mapping
+
+########################################################################################################################
+# Batch conversion of several ISA deliveries with a bounded pool of worker processes.
+########################################################################################################################
+
+_batch_context = dict()
+
+def load_manifest(manifest_filename):
+    with open(manifest_filename, 'r') as manifest_file:
+        manifest = yaml.safe_load(manifest_file)
+
+    # relative paths are resolved against the directory of the manifest
+    manifest_directory = os.path.dirname(os.path.abspath(manifest_filename))
+
+    jobs = list()
+    for index, job in enumerate(manifest['jobs']):
+        if 'input' not in job or 'output' not in job:
+            raise ValueError(f"job {index + 1} of manifest {manifest_filename} must contain input and output")
+
+        jobs.append({
+            'name': job.get('name', os.path.basename(os.path.normpath(job['input']))),
+            'input': os.path.normpath(os.path.join(manifest_directory, job['input'])),
+            'output': os.path.normpath(os.path.join(manifest_directory, job['output'])),
+            'config': os.path.normpath(os.path.join(manifest_directory, job['config'])) if job.get('config') is not None else None
+        })
+
+    return jobs
+
+def run_batch(jobs, workers=4, use_cache=True):
+    results = [None] * len(jobs)
+
+    # each config is loaded and its mapping templates are checked only once for all jobs using it
+    configs = dict()
+    config_errors = dict()
+
+    pending_jobs = list()
+    for index, job in enumerate(jobs):
+        config_filename = job['config']
+        if config_filename not in configs and config_filename not in config_errors:
+            try:
+                configs[config_filename] = load_config(config_filename)
+                compile_mapping(configs[config_filename])
+            except Exception as ex:
+                configs.pop(config_filename, None)
+                config_errors[config_filename] = ex
+
+        if config_filename in config_errors:
+            logging.error(f"job {job['name']} failed: could not load config {config_filename}: {config_errors[config_filename]}")
+            results[index] = _create_result(job, 'failed', f"could not load config {config_filename}: {config_errors[config_filename]}")
+        else:
+            pending_jobs.append(index)
+
+    if len(pending_jobs) == 0:
+        return results
+
+    # the loaded configs are passed once to each worker process, which converts one job after another
+    with ProcessPoolExecutor(max_workers=min(workers, len(pending_jobs)), initializer=_init_batch_worker, initargs=(configs, use_cache)) as executor:
+        futures = {executor.submit(_convert_job, jobs[index]): index for index in pending_jobs}
+
+        for future in as_completed(futures):
+            index = futures[future]
+
+            try:
+                results[index] = future.result()
+            except Exception as ex:
+                # a crashed worker process only fails the jobs it was running, all results are collected regardless
+                logging.error(f"job {jobs[index]['name']} failed: {ex}")
+                results[index] = _create_result(jobs[index], 'failed', str(ex))
+
+    return results
+
+def _init_batch_worker(configs, use_cache):
+    _batch_context['configs'] = configs
+    _batch_context['use_cache'] = use_cache
+
+def _convert_job(job):
+    logging.info(f"converting job {job['name']} ...")
+
+    start = time.perf_counter()
+    try:
+        if job['output'].lower().endswith('.zip'):
+            os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+        else:
+            os.makedirs(job['output'], exist_ok=True)
+
+        converter = IsaGtfsConverter(config=_batch_context['configs'][job['config']], use_cache=_batch_context['use_cache'])
+        converter.convert(job['input'], job['output'])
+    except Exception as ex:
+        logging.exception(f"job {job['name']} failed")
+        return _create_result(job, 'failed', str(ex), time.perf_counter() - start)
+
+    wall_time = time.perf_counter() - start
+
+    # rows written to all GTFS files are counted by the stages of the converter
+    num_rows = sum(
+        num_stage_rows
+        for stage_metrics in converter._stage_metrics.values()
+        for filename, num_stage_rows in stage_metrics['rows'].items()
+        if filename.endswith('.txt')
+    )
+
+    logging.info(f"finished job {job['name']} in {wall_time:.2f}s")
+
+    return _create_result(job, 'ok', None, wall_time, num_rows)
+
+def _create_result(job, status, error, wall_time=0.0, num_rows=0):
+    input_size = _input_size(job['input'])
+
+    return {
+        'name': job['name'],
+        'input': job['input'],
+        'output': job['output'],
+        'status': status,
+        'error': error,
+        'wall_time': wall_time,
+        'input_size': input_size,
+        'rows': num_rows,
+        'rows_per_second': num_rows / wall_time if wall_time > 0 else 0.0,
+        'bytes_per_second': input_size / wall_time if wall_time > 0 else 0.0
+    }
+
+def _input_size(input):
+    if os.path.isfile(input):
+        return os.path.getsize(input)
+    elif os.path.isdir(input):
+        return sum(os.path.getsize(os.path.join(input, filename)) for filename in os.listdir(input) if os.path.isfile(os.path.join(input, filename)))
+    else:
+        return 0
@@ -1,99 +1,298 @@
-import csv
+import io
+import json
 import logging
 import os
+import re
+import sys
+import time
 import yaml
 import zipfile
 
+from datetime import datetime
+
+from isa2gtfs.asc import AscCache, AscInput
+from isa2gtfs.sink import create_sink
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_MAPPING_PLACEHOLDERS = {
+    'station_id': ['stationId', 'stationInternationalId'],
+    'stop_id': ['stopId', 'stopInternationalId'],
+    'service_id': ['serviceId'],
+    'agency_id': ['agencyId'],
+    'route_id': ['routeId', 'routeInternationalId'],
+    'trip_id': ['tripRouteId', 'tripId', 'tripInternationalId']
+}
+
+class MappingTemplate:
+
+    def __init__(self, template_name, template, placeholders):
+        for placeholder in re.findall(r'\[(\w+)\]', template):
+            if placeholder not in placeholders:
+                raise ValueError(f"unknown placeholder [{placeholder}] in mapping template {template_name}, available placeholders are {', '.join(f'[{p}]' for p in placeholders)}")
+
+        self.template = template
+
+        # placeholders become fields of a format string, braces of the template itself are escaped
+        self._format = re.sub(r'\[(\w+)\]', r'{\1}', template.replace('{', '{{').replace('}', '}}')).format
+
+    def __call__(self, **values):
+        return self._format(**values)
+
+def _peak_memory():
+    if resource is None:
+        return None
+
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    else:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def load_config(config_filename=None):
+    if config_filename is not None:
+        with open(config_filename, 'r') as config_file:
+            config = yaml.safe_load(config_file)
+    else:
+        config = dict()
+
+        config['config'] = dict()
+        config['config']['extract_zone_ids'] = False
+        config['config']['extract_platform_codes'] = True
+        config['config']['generate_feed_info'] = True
+        config['config']['generate_feed_start_date'] = True
+        config['config']['generate_feed_end_date'] = True
+        config['config']['write_feed_id'] = False
+        config['config']['generate_calendar'] = False
+        config['config']['cache_directory'] = None
+        config['config']['cache_max_size'] = 1024
+        config['config']['incremental_directory'] = None
+
+        config['default'] = dict()
+        config['default']['agency_url'] = 'https://gtfs.org'
+        config['default']['agency_timezone'] = 'Europe/Berlin'
+        config['default']['agency_lang'] = 'de-DE'
+        config['default']['feed_info'] = dict()
+        config['default']['feed_info']['feed_publisher_name'] = 'YourCompanyName'
+        config['default']['feed_info']['feed_publisher_url'] = 'https://yourdomain.dev'
+        config['default']['feed_info']['feed_contact_url'] = 'https://yourdomain.dev/contact'
+        config['default']['feed_info']['feed_contact_email'] = 'contact@yourdomain.dev'
+        config['default']['feed_info']['feed_version'] = '%Y%m%d%H%M%S'
+        config['default']['feed_info']['feed_lang'] = 'de-DE'
+        config['default']['feed_info']['default_lang'] = 'de-DE'
+
+        config['mapping'] = dict()
+        config['mapping']['feed_id'] = 'COM'
+        config['mapping']['station_id'] = '[stationInternationalId]_Parent'
+        config['mapping']['stop_id'] = '[stopInternationalId]'
+        config['mapping']['service_id'] = 'service-[serviceId]'
+        config['mapping']['agency_id'] = 'agency-[agencyId]'
+        config['mapping']['route_id'] = '[routeInternationalId]'
+        config['mapping']['trip_id'] = '[tripRouteId][tripId]'
+
+    return config
+
+_mapping_template_cache = dict()
+
+def compile_mapping(config):
+    mapping = dict()
+
+    # templates are compiled once per process, so converters sharing a config also share its compiled templates
+    for template_name, placeholders in _MAPPING_PLACEHOLDERS.items():
+        template = config['mapping'][template_name]
+        if (template_name, template) not in _mapping_template_cache:
+            _mapping_template_cache[(template_name, template)] = MappingTemplate(template_name, template, placeholders)
+
+        mapping[template_name] = _mapping_template_cache[(template_name, template)]
+
+    return mapping
+
 class IsaGtfsConverter:
 
-    def __init__(self, config_filename=None, dialect='init51'):
+    def __init__(self, config_filename=None, dialect='init51', workers=1, use_cache=True, metrics_filename=None, config=None, asc_cache=None):
         self._dialect = dialect
+        self._workers = workers
+        self._metrics_filename = metrics_filename
         
-        if config_filename is not None:
-            with open(config_filename, 'r') as config_file:
-                self._config = yaml.safe_load(config_file)
+        # an already loaded config can be passed directly, e.g. to share it between several converters
+        if config is not None:
+            self._config = config
         else:
-            self._config = dict()
-
-            self._config['config'] = dict()
-            self._config['config']['extract_zone_ids'] = False
-            self._config['config']['extract_platform_codes'] = True
-            self._config['config']['generate_feed_info'] = True
-            self._config['config']['generate_feed_start_date'] = True
-            self._config['config']['generate_feed_end_date'] = True
-            self._config['config']['write_feed_id'] = False
-
-            self._config['default'] = dict()
-            self._config['default']['agency_url'] = 'https://gtfs.org'
-            self._config['default']['agency_timezone'] = 'Europe/Berlin'
-            self._config['default']['agency_lang'] = 'de-DE'
-            self._config['default']['feed_info'] = dict()
-            self._config['default']['feed_info']['feed_publisher_name'] = 'YourCompanyName'
-            self._config['default']['feed_info']['feed_publisher_url'] = 'https://yourdomain.dev'
-            self._config['default']['feed_info']['feed_contact_url'] = 'https://yourdomain.dev/contact'
-            self._config['default']['feed_info']['feed_contact_email'] = 'contact@yourdomain.dev'
-            self._config['default']['feed_info']['feed_version'] = '%Y%m%d%H%M%S'
-            self._config['default']['feed_info']['feed_lang'] = 'de-DE'
-            self._config['default']['feed_info']['default_lang'] = 'de-DE'
-
-            self._config['mapping'] = dict()
-            self._config['mapping']['feed_id'] = 'COM'
-            self._config['mapping']['station_id'] = '[stationInternationalId]_Parent'
-            self._config['mapping']['stop_id'] = '[stopInternationalId]'
-            self._config['mapping']['service_id'] = 'service-[serviceId]'
-            self._config['mapping']['agency_id'] = 'agency-[agencyId]'
-            self._config['mapping']['route_id'] = '[routeInternationalId]'
-            self._config['mapping']['trip_id'] = '[routeId][tripId]'
-
-        self._txt_files = list()
-        
-    def convert(self, input, output):
-        
-        if input.endswith('.zip'):
-            input_directory = os.path.dirname(input)
-        else:
-            input_directory = input
+            self._config = load_config(config_filename)
 
-        if output.endswith('.zip'):
-            output_directory = os.path.dirname(output)
+        # mapping templates are compiled once, so typos are reported before converting anything
+        self._mapping = compile_mapping(self._config)
+
+        # parsed ASC files are cached on disk only if a cache directory is configured, unless a cache is passed directly
+        cache_directory = self._config['config'].get('cache_directory', None)
+        if asc_cache is not None:
+            self._asc_cache = asc_cache
+        elif use_cache and cache_directory is not None:
+            cache_max_size = self._config['config'].get('cache_max_size', 1024)
+            self._asc_cache = AscCache(cache_directory, cache_max_size * 1024 * 1024)
         else:
-            output_directory = output
+            self._asc_cache = None
+
+        self._sink = None
+
+        self._stage = None
+        self._substage = None
+        self._stage_metrics = dict()
         
-        if input.endswith('.zip'):
-            logging.info(f"unpacking ZIP archive {input} ...")
+    def convert(self, input, output):
 
-            with zipfile.ZipFile(input, 'r') as zip_file:
-                zip_file.extractall(input_directory)
+        convert_start = (datetime.now(), time.perf_counter(), time.process_time())
+        self._stage_metrics = dict()
 
-        if self._dialect == 'init51':
-            from isa2gtfs.dialect import init51
-            init51.convert(self, input_directory, output_directory)
+        # the output is either a directory, a ZIP file or a sink object receiving the tables
+        if isinstance(output, str):
+            self._sink = create_sink(output)
         else:
-            logging.error(f"unknown dialect {self._dialect}")
+            self._sink = output
 
-        if output.endswith('.zip'):
-            logging.info(f"creating ZIP archive {output} ...")
+        # the input archive is opened once and closed after this conversion, so a replaced file is never read through an old handle
+        asc_input = AscInput(input)
+
+        try:
+            try:
+                if self._dialect == 'init51':
+                    from isa2gtfs.dialect import init51
+                    init51.convert(self, asc_input)
+                else:
+                    logging.error(f"unknown dialect {self._dialect}")
+            finally:
+                asc_input.close()
 
-            with zipfile.ZipFile(output, 'w') as zip_file:
-                for txt_file in self._txt_files:
-                    zip_file.write(
-                        txt_file,
-                        os.path.basename(txt_file),
-                        compress_type=zipfile.ZIP_DEFLATED
-                    )
+            self._start_stage('packaging')
+            self._sink.close()
+            self._finish_stage()
+        except BaseException:
+            # the output of a failed conversion is removed instead of being packaged
+            self._finish_stage()
+            self._sink.discard()
 
-                    os.remove(txt_file)
+            raise
+        finally:
+            if self._metrics_filename is not None:
+                self._write_metrics(input, output if isinstance(output, str) else type(output).__name__, convert_start)
 
-        if input.lower().endswith('.zip'):
-            for file in os.listdir(input_directory):
-                if file.lower().endswith('.asc') or file.lower().endswith('.txt'):
-                    os.remove(os.path.join(input_directory, file))
+        return self._sink
+    
+    def _start_stage(self, stage_name):
+        self._finish_stage()
+        self._stage = (self._create_metrics(self._stage_metrics, stage_name), time.perf_counter(), time.process_time())
+
+    def _finish_stage(self):
+        self._finish_substage()
+
+        if self._stage is not None:
+            stage_metrics, wall_start, cpu_start = self._stage
+            self._update_metrics(stage_metrics, wall_start, cpu_start)
+
+            # the peak memory is the peak resident set size of the process until the end of the stage
+            stage_metrics['peak_memory'] = _peak_memory()
+
+            self._stage = None
+
+    def _start_substage(self, substage_name):
+        self._finish_substage()
+
+        # substages like single lines are recorded within their stage
+        if self._stage is not None:
+            substages = self._stage[0].setdefault('substages', dict())
+            self._substage = (self._create_metrics(substages, substage_name), time.perf_counter(), time.process_time())
+
+    def _finish_substage(self):
+        if self._substage is not None:
+            substage_metrics, wall_start, cpu_start = self._substage
+            self._update_metrics(substage_metrics, wall_start, cpu_start)
+            substage_metrics['peak_memory'] = _peak_memory()
+
+            self._substage = None
+
+    def _count_rows(self, filename, num_rows):
+        for current_stage in (self._stage, self._substage):
+            if current_stage is not None:
+                rows = current_stage[0]['rows']
+                rows[filename] = rows.get(filename, 0) + num_rows
+
+    def _create_metrics(self, metrics, name):
+        return metrics.setdefault(name, {'wall_time': 0.0, 'cpu_time': 0.0, 'peak_memory': None, 'rows': dict()})
+
+    def _update_metrics(self, metrics, wall_start, cpu_start):
+        metrics['wall_time'] = metrics['wall_time'] + time.perf_counter() - wall_start
+        metrics['cpu_time'] = metrics['cpu_time'] + time.process_time() - cpu_start
+
+    def _write_metrics(self, input, output, convert_start):
+        started, wall_start, cpu_start = convert_start
+
+        metrics = {
+            'input': input,
+            'output': output,
+            'dialect': self._dialect,
+            'workers': self._workers,
+            'started': started.isoformat(timespec='seconds'),
+            'wall_time': time.perf_counter() - wall_start,
+            'cpu_time': time.process_time() - cpu_start,
+            'peak_memory': _peak_memory(),
+            'stages': self._stage_metrics
+        }
+
+        logging.info(f"writing metrics report {self._metrics_filename} ...")
+        with open(self._metrics_filename, 'w') as metrics_file:
+            json.dump(metrics, metrics_file, indent=4)
     
     def _write_txt_file(self, txt_filename, txt_headers, txt_data):
-        self._txt_files.append(txt_filename)
-        
-        with open(txt_filename, 'w', newline='', encoding='utf-8') as txt_file:
-            csv_writer = csv.writer(txt_file, delimiter=',', quotechar='"')
-            csv_writer.writerow(txt_headers)
-            csv_writer.writerows(txt_data)
-                
\ No newline at end of file
+        csv_writer = self._open_txt_file(txt_filename, txt_headers)
+        csv_writer.writerows(txt_data)
+
+        self._count_rows(txt_filename, len(txt_data))
+
+        self._close_txt_file(txt_filename)
+
+    def _open_txt_file(self, txt_filename, txt_headers):
+        return self._sink.open_table(txt_filename, txt_headers)
+
+    def _close_txt_file(self, txt_filename):
+        self._sink.close_table(txt_filename)
+
+class GtfsIsaConverter:
+
+    def __init__(self, dialect='init51'):
+        self._dialect = dialect
+
+        self._output_zip = None
+
+    def convert(self, input, output):
+
+        if output.lower().endswith('.zip'):
+            logging.info(f"creating ZIP archive {output} ...")
+
+            output_directory = os.path.dirname(output)
+            self._output_zip = zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED)
+        else:
+            output_directory = output
+            os.makedirs(output_directory, exist_ok=True)
+
+        try:
+            if self._dialect == 'init51':
+                from isa2gtfs.dialect import init51_export
+                init51_export.convert(self, input, output_directory)
+            else:
+                logging.error(f"unknown dialect {self._dialect}")
+        finally:
+            if self._output_zip is not None:
+                self._output_zip.close()
+                self._output_zip = None
+
+    def _write_asc_file(self, asc_filename, asc_file):
+        if self._output_zip is None:
+            asc_file.write(asc_filename)
+        else:
+            asc_data = io.StringIO(newline='')
+            asc_file.write_stream(asc_data)
+
+            self._output_zip.writestr(os.path.basename(asc_filename), asc_data.getvalue().encode('ISO-8859-1', errors='replace'))
@@ -1,9 +1,18 @@
+import hashlib
 import logging
 import os
+import pickle
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date, timedelta
 
-from isa2gtfs.asc import read_asc_file
+from isa2gtfs.asc import read_asc_file, iter_asc_records, iter_asc_groups, resolve_asc_file, hash_asc_file
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 _stop_id_map = dict()
 _agency_id_map = dict()
@@ -11,14 +20,36 @@ _route_id_map = dict()
 
 _version_map = dict()
 
-_service_list = list()
+_bitfield_map = dict()
+_service_bitfield_map = dict()
+_service_id_map = dict()
+
+_time_string_map = dict()
+_time_string_array = None
+
+_line_context = dict()
+
+_BITFIELD_LENGTH = 250
+
+_FRAGMENT_FORMAT_VERSION = 1
 
-def convert(converter_context, input_directory, output_directory):
+# only these columns of FDxxxxxx.ASC are used for trips and stop times
+_FDXXXXXX_COLUMNS = ['StartTime', 'TimeDemandType', 'ExternalTripNumber', 'BitfieldID', 'ID', 'InternationalTripID']
+
+def convert(converter_context, asc_input):
+
+    # lookups of a previous conversion in the same process must not leak into this one
+    for lookup_map in (_stop_id_map, _agency_id_map, _route_id_map, _version_map, _bitfield_map, _service_bitfield_map, _service_id_map, _line_context):
+        lookup_map.clear()
+
+    asc_cache = converter_context._asc_cache
 
     # load general attributes
+    converter_context._start_stage('load_stops')
     if converter_context._config['config']['extract_platform_codes']:
         logging.info('loading ATTRIBUT.ASC')
-        asc_attribut = read_asc_file(os.path.join(input_directory, 'ATTRIBUT.ASC'))
+        asc_attribut = read_asc_file(resolve_asc_file(asc_input, 'ATTRIBUT.ASC'), compact=True, cache=asc_cache)
+        converter_context._count_rows('ATTRIBUT.ASC', len(asc_attribut.records))
 
         platform_code_attribute_id = asc_attribut.find_record({'ShortName': 'GLEIS'}, ['ShortName'],  ['ShortName'])
         if platform_code_attribute_id is not None:
@@ -27,17 +58,22 @@ def convert(converter_context, input_directory, output_directory):
             logging.warning('could not determine platform_code attribute ID')
 
         logging.info('loading HSTATTRI.ASC ...')
-        asc_hstattri = read_asc_file(os.path.join(input_directory, 'HSTATTRI.ASC'))
+        asc_hstattri = read_asc_file(resolve_asc_file(asc_input, 'HSTATTRI.ASC'), compact=True, cache=asc_cache)
+        converter_context._count_rows('HSTATTRI.ASC', len(asc_hstattri.records))
     else:
         platform_code_attribute_id = None
 
     # create stops.txt
     logging.info('loading HALTESTE.ASC ...')
-    asc_halteste = read_asc_file(os.path.join(input_directory, 'HALTESTE.ASC'))  
+    asc_halteste = read_asc_file(resolve_asc_file(asc_input, 'HALTESTE.ASC'), compact=True, cache=asc_cache)  
+    converter_context._count_rows('HALTESTE.ASC', len(asc_halteste.records))
 
     if converter_context._config['config']['extract_zone_ids']:
         logging.info('loading TARIF.ASC ...')
-        asc_tarif = read_asc_file(os.path.join(input_directory, 'TARIF.ASC'))
+        asc_tarif = read_asc_file(resolve_asc_file(asc_input, 'TARIF.ASC'), compact=True, cache=asc_cache)
+        converter_context._count_rows('TARIF.ASC', len(asc_tarif.records))
+
+    converter_context._start_stage('stops')
 
     logging.info(f"found {len(asc_halteste.records)} stations - converting now ...")
     
@@ -48,8 +84,10 @@ def convert(converter_context, input_directory, output_directory):
             return
     
         if station['ParentID'] == '': # we have a parent station here
-            stop_id = converter_context._config['mapping']['station_id']
-            stop_id = stop_id.replace('[stationInternationalId]', station['InternationalStationID'])
+            stop_id = converter_context._mapping['station_id'](
+                stationId=station['ID'],
+                stationInternationalId=station['InternationalStationID']
+            )
             
             stop_name = station['LongName']
             stop_lat = station['Latitude']
@@ -92,16 +130,20 @@ def convert(converter_context, input_directory, output_directory):
             else:
                 platform_code = ''
             
-            stop_id = converter_context._config['mapping']['stop_id']
-            stop_id = stop_id.replace('[stopInternationalId]', station['InternationalStationID'])
+            stop_id = converter_context._mapping['stop_id'](
+                stopId=station['ID'],
+                stopInternationalId=station['InternationalStationID']
+            )
             
             stop_name = station['LongName']
             stop_lat = station['Latitude']
             stop_lon = station['Longitude']
             
             location_type = ''
-            parent_station = converter_context._config['mapping']['station_id']
-            parent_station = parent_station.replace('[stationInternationalId]', parent['InternationalStationID'])
+            parent_station = converter_context._mapping['station_id'](
+                stationId=parent['ID'],
+                stationInternationalId=parent['InternationalStationID']
+            )
             
             if converter_context._config['config']['extract_zone_ids']:
                 zone_id_record = asc_tarif.find_record(station, ['ID', 'DelivererID'], ['StationID', 'DelivererID'])
@@ -128,25 +170,23 @@ def convert(converter_context, input_directory, output_directory):
             
     logging.info('creating stops.txt ...')
     converter_context._write_txt_file(
-        os.path.join(output_directory, 'stops.txt'),
+        'stops.txt',
         ['stop_id', 'stop_name', 'stop_lat', 'stop_lon', 'location_type', 'parent_station', 'zone_id', 'platform_code'],
         txt_stops
     )
 
     # create agency.txt
-    logging.info('loading BETRIEBSTEILE.ASC ...')
-    asc_betriebsteile = read_asc_file(os.path.join(input_directory, 'BETRIEBSTEILE.ASC'))
-    
+    converter_context._start_stage('agencies')
     logging.info('loading BETRIEBE.ASC ...')
-    asc_betriebe = read_asc_file(os.path.join(input_directory, 'BETRIEBE.ASC'))
-    logging.info(f"found {len(asc_betriebsteile.records)} operator organisations and {len(asc_betriebe.records)} operators - converting now ...")
+    asc_betriebe = read_asc_file(resolve_asc_file(asc_input, 'BETRIEBE.ASC'), compact=True, cache=asc_cache)
+    converter_context._count_rows('BETRIEBE.ASC', len(asc_betriebe.records))
+    logging.info(f"found {len(asc_betriebe.records)} operators - converting operator organisations of BETRIEBSTEILE.ASC now ...")
     
     txt_agencies = list()
-    for operator_organisation in asc_betriebsteile.records:
+    for operator_organisation in iter_asc_records(resolve_asc_file(asc_input, 'BETRIEBSTEILE.ASC'), compact=True, cache=asc_cache):
         operator = asc_betriebe.find_record(operator_organisation, ['OperatorID'], ['ID'])
 
-        agency_id = converter_context._config['mapping']['agency_id']
-        agency_id = agency_id.replace('[agencyId]', str(operator['ID']))
+        agency_id = converter_context._mapping['agency_id'](agencyId=operator['ID'])
         
         agency_name = operator['Name']
         agency_url = converter_context._config['default']['agency_url']
@@ -163,16 +203,20 @@ def convert(converter_context, input_directory, output_directory):
         
         _agency_id_map[operator_organisation['ID']] = agency_id
         
+    converter_context._count_rows('BETRIEBSTEILE.ASC', len(txt_agencies))
+    
     logging.info('creating agency.txt ...')
     converter_context._write_txt_file(
-        os.path.join(output_directory, 'agency.txt'),
+        'agency.txt',
         ['agency_id', 'agency_name', 'agency_url', 'agency_timezone', 'agency_lang'],
         txt_agencies
     )
     
     # create routes.txt
+    converter_context._start_stage('routes')
     logging.info('loading LINIEN.ASC ...')
-    asc_linien = read_asc_file(os.path.join(input_directory, 'LINIEN.ASC'))
+    asc_linien = read_asc_file(resolve_asc_file(asc_input, 'LINIEN.ASC'), compact=True, cache=asc_cache)
+    converter_context._count_rows('LINIEN.ASC', len(asc_linien.records))
     logging.info(f"found {len(asc_linien.records)} routes - converting now ...")
     
     txt_routes = list()
@@ -189,8 +233,10 @@ def convert(converter_context, input_directory, output_directory):
             logging.error(f"route {route['OperatorOrganisationID']}-{route['LineNumber']} has not assigned an international ID")
             return
             
-        route_id = converter_context._config['mapping']['route_id']
-        route_id = route_id.replace('[routeInternationalId]', route['InternationalLineID'])
+        route_id = converter_context._mapping['route_id'](
+            routeId=route['LineNumber'],
+            routeInternationalId=route['InternationalLineID']
+        )
 
         agency_id = _agency_id_map[route['OperatorOrganisationID']]
         route_short_name = route['Name']
@@ -229,16 +275,18 @@ def convert(converter_context, input_directory, output_directory):
         
     logging.info('creating routes.txt ...')
     converter_context._write_txt_file(
-        os.path.join(output_directory, 'routes.txt'),
+        'routes.txt',
         ['route_id', 'agency_id', 'route_short_name', 'route_type'],
         txt_routes
     )
 
     # create calendar_dates.txt, trips.txt and stop_times.txt
+    converter_context._start_stage('versions')
     logging.info('loading VERSIONE.ASC ...')
-    asc_versione = read_asc_file(os.path.join(input_directory, 'VERSIONE.ASC'))
-
-    for version in asc_versione.records:
+    num_versions = 0
+    for version in iter_asc_records(resolve_asc_file(asc_input, 'VERSIONE.ASC'), compact=True, cache=asc_cache):
+        num_versions = num_versions + 1
+        
         _version_map[version['ID']] = (
             datetime.strptime(version['StartDate'], '%d.%m.%Y'),
             datetime.strptime(version['EndDate'], '%d.%m.%Y'),
@@ -249,202 +297,223 @@ def convert(converter_context, input_directory, output_directory):
             base_version_start_date = datetime.strptime(version['StartDate'], '%d.%m.%Y')
             base_version_end_date = datetime.strptime(version['EndDate'], '%d.%m.%Y')
     
+    converter_context._count_rows('VERSIONE.ASC', num_versions)
+    
     logging.info(f"base version starts at {base_version_start_date.strftime('%Y-%m-%d')} and ends at {base_version_end_date.strftime('%Y-%m-%d')}")
     
     logging.info('loading BITFELD.ASC ...')
-    asc_bitfeld = read_asc_file(os.path.join(input_directory, 'BITFELD.ASC'))
+    asc_bitfeld = read_asc_file(resolve_asc_file(asc_input, 'BITFELD.ASC'), compact=True, cache=asc_cache)
+    converter_context._count_rows('BITFELD.ASC', len(asc_bitfeld.records))
+
+    # trips.txt and stop_times.txt are written line by line, stop_times.txt is opened first as it is the largest table
+    converter_context._start_stage('trips')
+    logging.info('creating trips.txt and stop_times.txt ...')
+    csv_stop_times = converter_context._open_txt_file(
+        'stop_times.txt',
+        ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence', 'pickup_type', 'drop_off_type', 'shape_dist_travelled']
+    )
 
-    txt_trips = list()
-    txt_stop_times = list()
+    csv_trips = converter_context._open_txt_file(
+        'trips.txt',
+        ['route_id', 'service_id', 'trip_id', 'trip_headsign', 'trip_short_name', 'direction_id', 'block_id', 'shape_id', 'wheelchair_accessible', 'bikes_allowed']
+    )
     
+    # collect lines - INIT writes the same line for each line version ...
+    line_numbers = list()
+    line_routes = dict()
+
     processed_lines = list()
     for route in asc_linien.records:
+        line_routes.setdefault(route['LineNumber'], list()).append(route)
 
-        # check whether this line number has already been processed - INIT writes the same line for each line version ...
         line_identifier = f"{route['OperatorOrganisationID']}-{route['LineNumber']}"
         if line_identifier in processed_lines:
             continue
 
-        # beginn processing
-        logging.info(f"loading FD{route['LineNumber']}.ASC ...")
-        asc_fdxxxxxx = read_asc_file(os.path.join(input_directory, f"FD{route['LineNumber']}.ASC"))
+        line_numbers.append(route['LineNumber'])
 
-        logging.info(f"loading LD{route['LineNumber']}.ASC ...")
-        asc_ldxxxxxx = read_asc_file(os.path.join(input_directory, f"LD{route['LineNumber']}.ASC"))
+        # mark line as processed 
+        processed_lines.append(line_identifier)
 
-        # process each trip of this line
-        for sub_line_index, sub_line in enumerate(asc_fdxxxxxx.headers):
+    # provide all read-only lookups required for converting a single line
+    _line_context['asc_input'] = asc_input
+    _line_context['asc_cache'] = asc_cache
+    _line_context['trip_id'] = converter_context._mapping['trip_id']
+    _line_context['asc_halteste'] = asc_halteste
+    _line_context['asc_bitfeld'] = asc_bitfeld
 
-            logging.info(f"found LineNumber-LineVersionNumber-SubLineNumber-DirectionID ({sub_line['LineNumber']}-{sub_line['LineVersionNumber']}-{sub_line['SubLineNumber']}-{sub_line['DirectionID']}) - converting {sub_line['NumTrips']} trips now ...")
-        
-            ldxxxxxx_index, ldxxxxxx_header = asc_ldxxxxxx.find_header(
-                sub_line, 
-                ['LineNumber', 'LineVersionNumber', 'OperatorOrganisationID', 'DirectionID', 'SubLineNumber'],
-                ['LineNumber', 'LineVersionNumber', 'OperatorOrganisationID', 'DirectionID', 'SubLineNumber']
-            )
+    # in incremental mode, lines are only converted if their inputs changed since the last run
+    incremental_directory = converter_context._config['config'].get('incremental_directory', None)
 
-            ldxxxxxx_records = asc_ldxxxxxx.records[ldxxxxxx_index]
+    line_input_keys = dict()
+    if incremental_directory is not None:
+        # line numbers are only unique within one delivery, so each input gets its own fragments
+        fragment_directory = _fragment_directory(incremental_directory, asc_input)
+        os.makedirs(fragment_directory, exist_ok=True)
 
-            # extract bitfield of line version
-            line_version_bitfield_id = _version_map[ldxxxxxx_header['LineVersionNumber']][2]
-            if line_version_bitfield_id is not None and not line_version_bitfield_id == '':
-                line_version_bitfield = asc_bitfeld.find_record({'ID': line_version_bitfield_id}, ['ID'], ['ID'])
-                line_version_bitfield = _hex2bin(line_version_bitfield['Bitfield'])
-            else:
-                line_version_bitfield = _hex2bin('F' * 250)
+        for line_number in line_numbers:
+            line_input_keys[line_number] = _line_input_key(line_number, line_routes[line_number])
 
-            # extract basic trip data 
-            for trip in asc_fdxxxxxx.records[sub_line_index]:
-                route_id = _route_id_map[route['LineNumber']]
+        unchanged_lines = set(
+            line_number for line_number in line_numbers
+            if _check_fragment(_fragment_filename(fragment_directory, line_number), line_input_keys[line_number])
+        )
 
-                # extract trip bitfield
-                trip_bitfield = asc_bitfeld.find_record({'ID': trip['BitfieldID']}, ['ID'], ['ID'])
-                trip_bitfield = _hex2bin(trip_bitfield['Bitfield'])
+        logging.info(f"found {len(unchanged_lines)} unchanged lines - converting {len(line_numbers) - len(unchanged_lines)} lines now ...")
+    else:
+        fragment_directory = None
+        unchanged_lines = set()
 
-                # determine service bitfield out of line version bitfield and trip bitfield
-                service_bitfield = _bitwise_and(line_version_bitfield, trip_bitfield)
+    changed_lines = [line_number for line_number in line_numbers if line_number not in unchanged_lines]
 
-                # line versioning can result in bitfields with zero days active - consider a trip only travelling a certain weekday and line version only valid for three other weekdays
-                # if we have such a trip ... skip it
-                if service_bitfield == _hex2bin('0' * 250):
-                    continue
+    # convert lines in parallel if requested, results are merged in the order of LINIEN.ASC in both cases
+    if converter_context._workers > 1:
+        logging.info(f"converting {len(changed_lines)} lines using {converter_context._workers} workers ...")
 
-                if service_bitfield not in _service_list:
-                    _service_list.append(service_bitfield)
+        executor = ProcessPoolExecutor(
+            max_workers=converter_context._workers,
+            initializer=_init_line_worker,
+            initargs=(_line_context, _stop_id_map, _route_id_map, _version_map)
+        )
 
-                service_id = converter_context._config['mapping']['service_id']
-                service_id = service_id.replace('[serviceId]', str(_service_list.index(service_bitfield)))
-                
-                trip_id = converter_context._config['mapping']['trip_id']
-                trip_id = trip_id.replace('[tripRouteId]', route_id)
-                trip_id = trip_id.replace('[tripId]', trip['ID'])
-                trip_id = trip_id.replace('[tripInternationalId]', trip['InternationalTripID'])
+        line_results = _iter_line_results(executor, changed_lines, 2 * converter_context._workers)
+    else:
+        executor = None
+        line_results = map(_convert_line, changed_lines)
 
-                trip_headsign = ''
-                trip_short_name = trip['ExternalTripNumber']
+    try:
+        for line_number in line_numbers:
+            converter_context._start_substage(line_number)
 
-                direction_id = str(int(sub_line['DirectionID']) - 1)
+            if line_number in unchanged_lines:
+                fragment_rows = _load_fragment_rows(_fragment_filename(fragment_directory, line_number), line_input_keys[line_number])
+            else:
+                fragment_rows = None
 
-                # empty default values
-                block_id = ''
-                shape_id = ''
-                wheelchair_accessible = ''
-                bikes_allowed = ''
-
-                # extract travel times from corresponding ldxxxxxx
-                time_demand_type_index = trip['TimeDemandType']
-                time_demand_type_index = int(time_demand_type_index) - 1
-                
-                last_departure_time = trip['StartTime'].replace('.', ':')
-                last_stop_id = None
-                
-                for sub_line_item in ldxxxxxx_records:
-                    
-                    time_demand_type = sub_line_item['DIMENSIONS'][time_demand_type_index]
-
-                    travel_duration_seconds = _duration2seconds(time_demand_type['TravelTime'])
-                    waiting_duration_seconds = _duration2seconds(time_demand_type['WaitingTime'])
-
-                    arrival_time = last_departure_time
-                    departure_time = _datetime_add_seconds(arrival_time, waiting_duration_seconds)
-
-                    stop_id = _stop_id_map[sub_line_item['StopID']]
-                    stop_sequence = sub_line_item['ConsecutiveNumber']
-
-                    if time_demand_type['NoEntry']:
-                        pickup_type = '1'
-                    elif time_demand_type['DemandStop']:
-                        pickup_type = '3'
-                    else:
-                        pickup_type = '0'
-
-                    if time_demand_type['NoExit']:
-                        drop_off_type = '1'
-                    elif time_demand_type['DemandStop']:
-                        drop_off_type = '3'
-                    else:
-                        drop_off_type = '0'
-
-                    # empty default values
-                    shape_dist_travelled = '0'
-
-                    txt_stop_times.append([
-                        trip_id,
-                        arrival_time,
-                        departure_time,
-                        stop_id,
-                        stop_sequence,
-                        pickup_type,
-                        drop_off_type,
-                        shape_dist_travelled
-                    ])
+            if fragment_rows is not None:
+                txt_trips, txt_stop_times = fragment_rows
+            else:
+                # a fragment replaced since it was checked is not used, the line is converted in the main process instead
+                if line_number in unchanged_lines:
+                    logging.warning(f"fragment of line {line_number} changed during the conversion - converting line {line_number} now ...")
+                    txt_trips, txt_stop_times, dependencies, asc_rows = _convert_line(line_number)
+                else:
+                    txt_trips, txt_stop_times, dependencies, asc_rows = next(line_results)
+
+                # rows of FDxxxxxx and LDxxxxxx are read by the line conversion, possibly in a worker process
+                for asc_filename, num_rows in asc_rows.items():
+                    converter_context._count_rows(asc_filename, num_rows)
+
+                if fragment_directory is not None:
+                    _store_fragment(
+                        _fragment_filename(fragment_directory, line_number),
+                        line_input_keys[line_number],
+                        txt_trips,
+                        txt_stop_times,
+                        dependencies
+                    )
+
+            # assign service IDs in the main process, so they're stable regardless of the number of workers
+            for txt_trip in txt_trips:
+                service_index = _service_id_map.setdefault(txt_trip[1], len(_service_id_map))
+
+                txt_trip[1] = converter_context._mapping['service_id'](serviceId=service_index)
+
+            # write trips and stop times of this line
+            csv_trips.writerows(txt_trips)
+            csv_stop_times.writerows(txt_stop_times)
+
+            converter_context._count_rows('trips.txt', len(txt_trips))
+            converter_context._count_rows('stop_times.txt', len(txt_stop_times))
+
+            converter_context._finish_substage()
+    except BaseException:
+        # lines which did not start yet are cancelled instead of being converted after an error
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # remove fragments of lines which don't exist anymore
+    if fragment_directory is not None:
+        line_fragments = set(os.path.basename(_fragment_filename(fragment_directory, line_number)) for line_number in line_numbers)
+        for fragment_filename in os.listdir(fragment_directory):
+            if fragment_filename.startswith('FRAGMENT_') and fragment_filename not in line_fragments:
+                os.remove(os.path.join(fragment_directory, fragment_filename))
+
+    converter_context._close_txt_file('stop_times.txt')
+    converter_context._close_txt_file('trips.txt')
+
+    # create calendar.txt and calendar_dates.txt out of bitfields
+    converter_context._start_stage('calendar')
+    service_days = list(_daterange(base_version_start_date, base_version_end_date))
+    service_dates = [day.strftime('%Y%m%d') for day in service_days]
+    service_weekdays = [day.weekday() for day in service_days]
+
+    generate_calendar = converter_context._config['config'].get('generate_calendar', False)
+
+    txt_calendar = list()
+    txt_calendar_dates = list()
+    for service_bitfield, i in _service_id_map.items():
+        service_id = converter_context._mapping['service_id'](serviceId=i)
 
-                    # set next travel time
-                    last_departure_time = _datetime_add_seconds(departure_time, travel_duration_seconds)
-                    last_stop_id = sub_line_item['StopID']
+        bitfield = _bitfield2bin(service_bitfield)[:len(service_dates)]
 
-                # add trip dataset after generating stop times
-                trip_headsign_stop = asc_halteste.find_record({'ID': last_stop_id}, ['ID'], ['ID'])
-                if trip_headsign_stop is not None:
-                    trip_headsign_station = asc_halteste.find_record(trip_headsign_stop, ['ParentID', 'ParentDelivererID'], ['ID', 'DelivererID'])
-                    if trip_headsign_station is not None:
-                        trip_headsign = trip_headsign_station['LongName']
+        if generate_calendar:
+            # write dominant weekly pattern to calendar.txt and deviating days only to calendar_dates.txt
+            first_day = bitfield.find('1')
+            if first_day < 0:
+                continue
 
-                txt_trips.append([
-                    route_id,
-                    service_id,
-                    trip_id,
-                    trip_headsign,
-                    trip_short_name,
-                    direction_id,
-                    block_id,
-                    shape_id,
-                    wheelchair_accessible,
-                    bikes_allowed
-                ])
+            last_day = bitfield.rfind('1')
 
-        # mark line as processed 
-        processed_lines.append(line_identifier)
+            weekday_pattern = _weekday_pattern(bitfield, service_weekdays, first_day, last_day)
+            if '1' in weekday_pattern:
+                txt_calendar.append(
+                    [service_id] + weekday_pattern + [service_dates[first_day], service_dates[last_day]]
+                )
 
-    logging.info('creating trips.txt ...')
-    converter_context._write_txt_file(
-        os.path.join(output_directory, 'trips.txt'),
-        ['route_id', 'service_id', 'trip_id', 'trip_headsign', 'trip_short_name', 'direction_id', 'block_id', 'shape_id', 'wheelchair_accessible', 'bikes_allowed'],
-        txt_trips
-    )
+            for c in range(first_day, last_day + 1):
+                if bitfield[c] != weekday_pattern[service_weekdays[c]]:
+                    exception_type = '1' if bitfield[c] == '1' else '2'
 
-    logging.info('creating stop_times.txt ...')
-    converter_context._write_txt_file(
-        os.path.join(output_directory, 'stop_times.txt'),
-        ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence', 'pickup_type', 'drop_off_type', 'shape_dist_travelled'],
-        txt_stop_times
-    )
+                    txt_calendar_dates.append([
+                        service_id,
+                        service_dates[c],
+                        exception_type
+                    ])
+        else:
+            for c, bit in enumerate(bitfield):
+                if bit == '1':
 
-    # create calendar_dates.txt out of bitfields
-    txt_calendar_dates = list()
-    for i, bitfield in enumerate(_service_list):
-        service_id = converter_context._config['mapping']['service_id']
-        service_id = service_id.replace('[serviceId]', str(i))
-                   
-        for c, day in enumerate(_daterange(base_version_start_date, base_version_end_date)):                
-            if bitfield[c] == '1':
-                
-                exception_type = '1'
-            
-                txt_calendar_dates.append([
-                    service_id,
-                    day.strftime('%Y%m%d'),
-                    exception_type
-                ])
+                    exception_type = '1'
+
+                    txt_calendar_dates.append([
+                        service_id,
+                        service_dates[c],
+                        exception_type
+                    ])
+
+    if generate_calendar:
+        logging.info('creating calendar.txt ...')
+        converter_context._write_txt_file(
+            'calendar.txt',
+            ['service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday', 'start_date', 'end_date'],
+            txt_calendar
+        )
 
     logging.info('creating calendar_dates.txt ...')
     converter_context._write_txt_file(
-        os.path.join(output_directory, 'calendar_dates.txt'),
+        'calendar_dates.txt',
         ['service_id', 'date', 'exception_type'],
         txt_calendar_dates
     )
 
     # finally, create feed_info if requested
+    converter_context._start_stage('feed_info')
     if converter_context._config['config']['generate_feed_info']:
         feed_info_headers = ['feed_publisher_name', 'feed_publisher_url', 'feed_contact_url', 'feed_contact_email', 'feed_lang', 'default_lang', 'feed_version']
 
@@ -472,16 +541,285 @@ def convert(converter_context, input_directory, output_directory):
 
         logging.info('creating feed_info.txt ...')
         converter_context._write_txt_file(
-            os.path.join(output_directory, 'feed_info.txt'),
+            'feed_info.txt',
             feed_info_headers,
             feed_info_values
         )
         
+def _init_line_worker(line_context, stop_id_map, route_id_map, version_map):
+    _line_context.update(line_context)
+    _stop_id_map.update(stop_id_map)
+    _route_id_map.update(route_id_map)
+    _version_map.update(version_map)
+
+def _iter_line_results(executor, line_numbers, max_pending_lines):
+    # only a limited number of lines is submitted ahead, so converted lines don't pile up in memory until they are written
+    pending_results = deque()
+
+    for line_number in line_numbers:
+        pending_results.append(executor.submit(_convert_line, line_number))
+
+        if len(pending_results) >= max_pending_lines:
+            yield pending_results.popleft().result()
+
+    while len(pending_results) > 0:
+        yield pending_results.popleft().result()
+
+def _convert_line(line_number):
+    asc_input = _line_context['asc_input']
+    asc_cache = _line_context['asc_cache']
+    asc_halteste = _line_context['asc_halteste']
+    asc_bitfeld = _line_context['asc_bitfeld']
+
+    txt_trips = list()
+    txt_stop_times = list()
+
+    # remember which stops and bitfields contributed to this line
+    dependency_stop_ids = set()
+    dependency_bitfield_ids = set()
+
+    # beginn processing
+    logging.info(f"loading LD{line_number}.ASC ...")
+    asc_ldxxxxxx = read_asc_file(resolve_asc_file(asc_input, f"LD{line_number}.ASC"), compact=True, cache=asc_cache)
+
+    # rows read from FDxxxxxx and LDxxxxxx including their header rows
+    asc_rows = {
+        'LDxxxxxx.ASC': len(asc_ldxxxxxx.headers) + sum(len(record_group) for record_group in asc_ldxxxxxx.records),
+        'FDxxxxxx.ASC': 0
+    }
+
+    # process each trip of this line, the FDxxxxxx file is read sub line by sub line
+    logging.info(f"reading FD{line_number}.ASC ...")
+    for sub_line, sub_line_trips in iter_asc_groups(resolve_asc_file(asc_input, f"FD{line_number}.ASC"), compact=True, cache=asc_cache, columns=_FDXXXXXX_COLUMNS):
+        asc_rows['FDxxxxxx.ASC'] = asc_rows['FDxxxxxx.ASC'] + 1 + len(sub_line_trips)
+
+        logging.info(f"found LineNumber-LineVersionNumber-SubLineNumber-DirectionID ({sub_line['LineNumber']}-{sub_line['LineVersionNumber']}-{sub_line['SubLineNumber']}-{sub_line['DirectionID']}) - converting {sub_line['NumTrips']} trips now ...")
+    
+        ldxxxxxx_header, ldxxxxxx_records = asc_ldxxxxxx.find_record_group(
+            sub_line, 
+            ['LineNumber', 'LineVersionNumber', 'OperatorOrganisationID', 'DirectionID', 'SubLineNumber'],
+            ['LineNumber', 'LineVersionNumber', 'OperatorOrganisationID', 'DirectionID', 'SubLineNumber']
+        )
+
+        if ldxxxxxx_header is None:
+            logging.error(f"could not find sub line {sub_line['LineNumber']}-{sub_line['LineVersionNumber']}-{sub_line['SubLineNumber']}-{sub_line['DirectionID']} in LD{line_number}.ASC")
+            continue
+
+        # parse travel and waiting times of each time demand type once per sub line
+        ldxxxxxx_durations = [
+            [(_duration2seconds(d['TravelTime']), _duration2seconds(d['WaitingTime'])) for d in sub_line_item.dimensions()]
+            for sub_line_item in ldxxxxxx_records
+        ]
+
+        # extract bitfield ID of line version
+        line_version_bitfield_id = _version_map[ldxxxxxx_header['LineVersionNumber']][2]
+        if line_version_bitfield_id == '':
+            line_version_bitfield_id = None
+
+        dependency_stop_ids.update(sub_line_item['StopID'] for sub_line_item in ldxxxxxx_records)
+        if line_version_bitfield_id is not None:
+            dependency_bitfield_ids.add(line_version_bitfield_id)
+
+        # generate arrival and departure times of all trips of this sub line at once
+        sub_line_trip_times = _sub_line_trip_times(sub_line_trips, ldxxxxxx_durations)
+
+        # static columns of stop times and the headsign only depend on the time demand type of a trip
+        trip_patterns = dict()
+
+        # extract basic trip data 
+        for trip, (arrival_times, departure_times) in zip(sub_line_trips, sub_line_trip_times):
+            route_id = _route_id_map[line_number]
+
+            # determine service bitfield out of line version bitfield and trip bitfield
+            service_bitfield = _service_bitfield(asc_bitfeld, line_version_bitfield_id, trip['BitfieldID'])
+            dependency_bitfield_ids.add(trip['BitfieldID'])
+
+            # line versioning can result in bitfields with zero days active - consider a trip only travelling a certain weekday and line version only valid for three other weekdays
+            # if we have such a trip ... skip it
+            if service_bitfield == 0:
+                continue
+
+            trip_id = _line_context['trip_id'](
+                tripRouteId=route_id,
+                tripId=trip['ID'],
+                tripInternationalId=trip['InternationalTripID']
+            )
+
+            trip_short_name = trip['ExternalTripNumber']
+
+            direction_id = str(int(sub_line['DirectionID']) - 1)
+
+            # empty default values
+            block_id = ''
+            shape_id = ''
+            wheelchair_accessible = ''
+            bikes_allowed = ''
+
+            # extract travel times from corresponding ldxxxxxx
+            time_demand_type_index = trip['TimeDemandType']
+            time_demand_type_index = int(time_demand_type_index) - 1
+
+            if time_demand_type_index not in trip_patterns:
+                trip_patterns[time_demand_type_index] = _trip_pattern(asc_halteste, ldxxxxxx_records, time_demand_type_index)
+
+            trip_pattern_stop_times, trip_headsign = trip_patterns[time_demand_type_index]
+
+            for (stop_id, stop_sequence, pickup_type, drop_off_type), arrival_time, departure_time in zip(trip_pattern_stop_times, arrival_times, departure_times):
+                
+                # empty default values
+                shape_dist_travelled = '0'
+
+                txt_stop_times.append([
+                    trip_id,
+                    arrival_time,
+                    departure_time,
+                    stop_id,
+                    stop_sequence,
+                    pickup_type,
+                    drop_off_type,
+                    shape_dist_travelled
+                ])
+
+            # the service ID is assigned when merging the results of all lines
+            txt_trips.append([
+                route_id,
+                service_bitfield,
+                trip_id,
+                trip_headsign,
+                trip_short_name,
+                direction_id,
+                block_id,
+                shape_id,
+                wheelchair_accessible,
+                bikes_allowed
+            ])
+
+    return txt_trips, txt_stop_times, _line_dependencies(dependency_stop_ids, dependency_bitfield_ids), asc_rows
+
+def _trip_pattern(asc_halteste, ldxxxxxx_records, time_demand_type_index):
+    trip_pattern_stop_times = list()
+    for sub_line_item in ldxxxxxx_records:
+        time_demand_type = sub_line_item.dimension(time_demand_type_index)
+
+        stop_id = _stop_id_map[sub_line_item['StopID']]
+        stop_sequence = sub_line_item['ConsecutiveNumber']
+
+        if time_demand_type['NoEntry']:
+            pickup_type = '1'
+        elif time_demand_type['DemandStop']:
+            pickup_type = '3'
+        else:
+            pickup_type = '0'
+
+        if time_demand_type['NoExit']:
+            drop_off_type = '1'
+        elif time_demand_type['DemandStop']:
+            drop_off_type = '3'
+        else:
+            drop_off_type = '0'
+
+        trip_pattern_stop_times.append((stop_id, stop_sequence, pickup_type, drop_off_type))
+
+    # the headsign is the name of the parent station of the last stop
+    if len(ldxxxxxx_records) > 0:
+        trip_headsign = _stop_headsign(asc_halteste, ldxxxxxx_records[-1]['StopID'])
+    else:
+        trip_headsign = ''
+
+    return trip_pattern_stop_times, trip_headsign
+
+def _line_dependencies(stop_ids, bitfield_ids):
+    asc_halteste = _line_context['asc_halteste']
+    asc_bitfeld = _line_context['asc_bitfeld']
+
+    return {
+        'stops': {stop_id: (_stop_id_map[stop_id], _stop_headsign(asc_halteste, stop_id)) for stop_id in stop_ids},
+        'bitfields': {bitfield_id: _bitfield(asc_bitfeld, bitfield_id) for bitfield_id in bitfield_ids}
+    }
+
+def _line_input_key(line_number, line_routes):
+    key_hash = hashlib.sha256()
+
+    # the key covers all inputs of a line except stops and bitfields, which are checked by their dependencies
+    key_hash.update(f"{_FRAGMENT_FORMAT_VERSION}:{line_number}:{_route_id_map[line_number]}:{_line_context['trip_id'].template}:".encode('utf-8'))
+    key_hash.update(repr([tuple(route.items()) for route in line_routes]).encode('utf-8'))
+    key_hash.update(repr(sorted(_version_map.items())).encode('utf-8'))
+
+    for filename in [f"FD{line_number}.ASC", f"LD{line_number}.ASC"]:
+        key_hash.update(hash_asc_file(resolve_asc_file(_line_context['asc_input'], filename)).encode('utf-8'))
+
+    return key_hash.hexdigest()
+
+def _fragment_filename(fragment_directory, line_number):
+    return os.path.join(fragment_directory, 'FRAGMENT_' + ''.join(c if c.isalnum() else '_' for c in line_number) + '.pickle')
+
+def _fragment_directory(incremental_directory, asc_input):
+    input_path = os.path.abspath(asc_input.input_path)
+    input_name = ''.join(c if c.isalnum() else '_' for c in os.path.basename(input_path))
+
+    return os.path.join(incremental_directory, f"INPUT_{input_name}_{hashlib.sha256(input_path.encode('utf-8')).hexdigest()[:16]}")
+
+def _check_fragment(fragment_filename, input_key):
+    # the fragment metadata is stored in front of the rows, so checking a fragment doesn't load its rows
+    try:
+        with open(fragment_filename, 'rb') as fragment_file:
+            return _check_fragment_meta(fragment_file, input_key)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return False
+
+def _load_fragment_rows(fragment_filename, input_key):
+    # the key is checked again with the same file handle the rows are read from, as the fragment might have been replaced in the meantime
+    try:
+        with open(fragment_filename, 'rb') as fragment_file:
+            if not _check_fragment_meta(fragment_file, input_key):
+                return None
+
+            return pickle.load(fragment_file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+def _check_fragment_meta(fragment_file, input_key):
+    fragment_meta = pickle.load(fragment_file)
+
+    if not fragment_meta['key'] == input_key:
+        return False
+
+    return fragment_meta['dependencies'] == _line_dependencies(fragment_meta['dependencies']['stops'].keys(), fragment_meta['dependencies']['bitfields'].keys())
+
+def _store_fragment(fragment_filename, input_key, txt_trips, txt_stop_times, dependencies):
+    temp_filename = f"{fragment_filename}.{os.getpid()}.tmp"
+
+    with open(temp_filename, 'wb') as fragment_file:
+        pickle.dump({'key': input_key, 'dependencies': dependencies}, fragment_file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump((txt_trips, txt_stop_times), fragment_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(temp_filename, fragment_filename)
+
+def _stop_headsign(asc_halteste, stop_id):
+    trip_headsign_stop = asc_halteste.find_record({'ID': stop_id}, ['ID'], ['ID'])
+    if trip_headsign_stop is not None:
+        trip_headsign_station = asc_halteste.find_record(trip_headsign_stop, ['ParentID', 'ParentDelivererID'], ['ID', 'DelivererID'])
+        if trip_headsign_station is not None:
+            return trip_headsign_station['LongName']
+
+    return ''
+
 def _daterange(start_date: date, end_date: date):
     days = int((end_date - start_date).days)
     for n in range(days):
         yield start_date + timedelta(n)
 
+def _weekday_pattern(bitfield, weekdays, first_day, last_day):
+    num_active = [0] * 7
+    num_total = [0] * 7
+    for c in range(first_day, last_day + 1):
+        num_total[weekdays[c]] += 1
+        if bitfield[c] == '1':
+            num_active[weekdays[c]] += 1
+
+    # a weekday is part of the pattern if the service is active on at least half of its occurences
+    return ['1' if num_total[w] > 0 and num_active[w] * 2 >= num_total[w] else '0' for w in range(7)]
+
 def _duration2seconds(input_string: str):
     minutes, seconds = input_string.split(':')
     minutes = int(minutes)
@@ -489,37 +827,96 @@ def _duration2seconds(input_string: str):
 
     return seconds + (minutes * 60)
 
-def _datetime_add_seconds(input_datetime, add_seconds):
-    input_datetime = input_datetime.replace('.', ':')
-    hours, minutes, seconds = input_datetime.split(':')
+def _time_demand_offsets(ldxxxxxx_durations, time_demand_type_index):
+    arrival_offsets = list()
+    departure_offsets = list()
 
-    timestamp = timedelta(hours=int(hours)) + datetime.strptime(f"{minutes}:{seconds}", "%M:%S")
-    timestamp = timestamp + timedelta(seconds=add_seconds)
+    offset = 0
+    for sub_line_durations in ldxxxxxx_durations:
+        travel_duration_seconds, waiting_duration_seconds = sub_line_durations[time_demand_type_index]
 
-    total_seconds = int(int(hours) * 3600 + int(minutes) * 60 + int(seconds) + add_seconds)
-    if total_seconds >= (24 * 60 * 60):
-        hours = int(total_seconds / 3600)
-        return f"{hours}:{timestamp.strftime('%M:%S')}"
-    else:
-        return timestamp.strftime('%H:%M:%S')
+        arrival_offsets.append(offset)
+        offset = offset + waiting_duration_seconds
+
+        departure_offsets.append(offset)
+        offset = offset + travel_duration_seconds
+
+    return arrival_offsets, departure_offsets
 
-def _hex2bin(hexrepr):
-    byterepr = bytes.fromhex(hexrepr)
-    bitrepr = ''
-    for irepr in byterepr:
-        bitrepr = bitrepr + f'{irepr:08b}'
+def _sub_line_trip_times(sub_line_trips, ldxxxxxx_durations):
+    # all trips of a sub line sharing the same time demand type only differ in their start time
+    time_demand_type_trips = dict()
+    for trip_index, trip in enumerate(sub_line_trips):
+        time_demand_type_index = int(trip['TimeDemandType']) - 1
+        time_demand_type_trips.setdefault(time_demand_type_index, list()).append(trip_index)
+
+    trip_times = [None] * len(sub_line_trips)
+    for time_demand_type_index, trip_indices in time_demand_type_trips.items():
+        arrival_offsets, departure_offsets = _time_demand_offsets(ldxxxxxx_durations, time_demand_type_index)
+        start_seconds = [_time2seconds(sub_line_trips[i]['StartTime']) for i in trip_indices]
+
+        if numpy is not None:
+            start_seconds = numpy.array(start_seconds, dtype=numpy.int64)[:, numpy.newaxis]
+
+            arrival_times = _seconds2time_array(start_seconds + numpy.array(arrival_offsets, dtype=numpy.int64)).tolist()
+            departure_times = _seconds2time_array(start_seconds + numpy.array(departure_offsets, dtype=numpy.int64)).tolist()
+
+            for i, trip_index in enumerate(trip_indices):
+                trip_times[trip_index] = (arrival_times[i], departure_times[i])
+        else:
+            for start, trip_index in zip(start_seconds, trip_indices):
+                trip_times[trip_index] = (
+                    [_seconds2time(start + o) for o in arrival_offsets],
+                    [_seconds2time(start + o) for o in departure_offsets]
+                )
+
+    return trip_times
+
+def _time2seconds(input_string: str):
+    hours, minutes, seconds = input_string.replace('.', ':').split(':')
+
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+def _seconds2time(input_seconds: int):
+    # times are formatted once and then reused, GTFS allows hours beyond 24:00:00 here
+    if input_seconds not in _time_string_map:
+        hours, remainder = divmod(input_seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+
+        _time_string_map[input_seconds] = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+    return _time_string_map[input_seconds]
+
+def _seconds2time_array(input_seconds):
+    global _time_string_array
+
+    # times are looked up in an array of formatted times indexed by seconds, which is extended up to the latest time required
+    num_seconds = int(input_seconds.max()) + 1 if input_seconds.size > 0 else 0
+    if _time_string_array is None or len(_time_string_array) < num_seconds:
+        _time_string_array = numpy.array([_seconds2time(t) for t in range(max(num_seconds, 48 * 3600))], dtype=object)
+
+    return _time_string_array[input_seconds]
+
+def _bitfield(asc_bitfeld, bitfield_id):
+    if bitfield_id not in _bitfield_map:
+        bitfield = asc_bitfeld.find_record({'ID': bitfield_id}, ['ID'], ['ID'])
+        _bitfield_map[bitfield_id] = int(bitfield['Bitfield'], 16)
         
-    return bitrepr
+    return _bitfield_map[bitfield_id]
 
-def _bitwise_and(bitfield_a, bitfield_b):
-    if not len(bitfield_a) == len(bitfield_b):
-        raise ValueError(f"bitfield A and bitfield B must have exactly the same length")
+def _service_bitfield(asc_bitfeld, line_version_bitfield_id, trip_bitfield_id):
+    key = (line_version_bitfield_id, trip_bitfield_id)
     
-    bitfield_r = ''
-    for i in range(0, len(bitfield_a)):
-        if bitfield_a[i] == '1' and bitfield_b[i] == '1':
-            bitfield_r = bitfield_r + '1'
-        else:
-            bitfield_r = bitfield_r + '0'
+    if key not in _service_bitfield_map:
+        service_bitfield = _bitfield(asc_bitfeld, trip_bitfield_id)
+        
+        # line versions without bitfield are valid on every day
+        if line_version_bitfield_id is not None:
+            service_bitfield = service_bitfield & _bitfield(asc_bitfeld, line_version_bitfield_id)
+            
+        _service_bitfield_map[key] = service_bitfield
+        
+    return _service_bitfield_map[key]
 
-    return bitfield_r
\ No newline at end of file
+def _bitfield2bin(bitfield):
+    return f'{bitfield:0{_BITFIELD_LENGTH * 4}b}'
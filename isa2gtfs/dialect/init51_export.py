@@ -0,0 +1,393 @@
+import csv
+import io
+import logging
+import os
+import zipfile
+
+from datetime import datetime, timedelta
+
+from isa2gtfs.asc import create_asc_file
+
+_BITFIELD_LENGTH = 250
+
+_DELIVERER_ID = 'GTFS'
+_VEHICLE_TYPE_ID = 'GTFS'
+
+def convert(converter_context, input_path, output_directory):
+
+    # create HALTESTE.ASC, HSTATTRI.ASC and TARIF.ASC
+    logging.info('loading stops.txt ...')
+    txt_stops = list(_iter_txt_file(input_path, 'stops.txt'))
+
+    station_id_map = dict()
+    for station_id, stop in enumerate(txt_stops, 1):
+        station_id_map[stop['stop_id']] = station_id
+
+    logging.info(f"found {len(txt_stops)} stops - converting now ...")
+
+    asc_attribut = create_asc_file('ATTRIBUT.ASC')
+    asc_attribut.records.append(asc_attribut.create_record({'ID': 'GL', 'ShortName': 'GLEIS', 'IsMetaAttribute': False}))
+
+    asc_halteste = create_asc_file('HALTESTE.ASC')
+    asc_hstattri = create_asc_file('HSTATTRI.ASC')
+    asc_tarif = create_asc_file('TARIF.ASC')
+
+    for stop in txt_stops:
+
+        # entrances, nodes and boarding areas are not part of ISA
+        if stop.get('location_type', '') not in ('', '0', '1'):
+            continue
+
+        station_id = station_id_map[stop['stop_id']]
+
+        parent_station = stop.get('parent_station', '')
+        if parent_station != '' and parent_station in station_id_map:
+            parent_id = station_id_map[parent_station]
+            parent_deliverer_id = _DELIVERER_ID
+        else:
+            parent_id = ''
+            parent_deliverer_id = ''
+
+        asc_halteste.records.append(asc_halteste.create_record({
+            'ID': station_id,
+            'DelivererID': _DELIVERER_ID,
+            'ParentID': parent_id,
+            'ParentDelivererID': parent_deliverer_id,
+            'Longitude': stop.get('stop_lon', ''),
+            'Latitude': stop.get('stop_lat', ''),
+            'LongName': stop.get('stop_name', ''),
+            'InternationalStationID': stop['stop_id']
+        }))
+
+        if stop.get('platform_code', '') != '':
+            asc_hstattri.records.append(asc_hstattri.create_record({
+                'DelivererID': _DELIVERER_ID,
+                'ID': station_id,
+                'AttributeID': 'GL',
+                'AttributeValue': stop['platform_code']
+            }))
+
+        if stop.get('zone_id', '') != '':
+            asc_tarif.records.append(asc_tarif.create_record({
+                'StationID': station_id,
+                'DelivererID': _DELIVERER_ID,
+                'Area': stop['zone_id']
+            }))
+
+    logging.info('creating HALTESTE.ASC, HSTATTRI.ASC and TARIF.ASC ...')
+    converter_context._write_asc_file(os.path.join(output_directory, 'ATTRIBUT.ASC'), asc_attribut)
+    converter_context._write_asc_file(os.path.join(output_directory, 'HALTESTE.ASC'), asc_halteste)
+    converter_context._write_asc_file(os.path.join(output_directory, 'HSTATTRI.ASC'), asc_hstattri)
+    converter_context._write_asc_file(os.path.join(output_directory, 'TARIF.ASC'), asc_tarif)
+
+    # create BETRIEBE.ASC and BETRIEBSTEILE.ASC with one operator organisation per agency
+    logging.info('loading agency.txt ...')
+
+    asc_betriebe = create_asc_file('BETRIEBE.ASC')
+    asc_betriebsteile = create_asc_file('BETRIEBSTEILE.ASC')
+
+    operator_organisation_id_map = dict()
+    for operator_id, agency in enumerate(_iter_txt_file(input_path, 'agency.txt'), 1):
+        asc_betriebe.records.append(asc_betriebe.create_record({
+            'ID': operator_id,
+            'OperatorNumber': operator_id,
+            'Code': str(operator_id),
+            'Name': agency['agency_name']
+        }))
+
+        asc_betriebsteile.records.append(asc_betriebsteile.create_record({
+            'Code': str(operator_id),
+            'Name': agency['agency_name'],
+            'ID': str(operator_id),
+            'VehicleTypeGroup': 'Bus',
+            'DelivererID': _DELIVERER_ID,
+            'OperatorID': operator_id,
+            'OrganisationNumber': operator_id
+        }))
+
+        operator_organisation_id_map[agency.get('agency_id', '')] = str(operator_id)
+
+    logging.info('creating BETRIEBE.ASC and BETRIEBSTEILE.ASC ...')
+    converter_context._write_asc_file(os.path.join(output_directory, 'BETRIEBE.ASC'), asc_betriebe)
+    converter_context._write_asc_file(os.path.join(output_directory, 'BETRIEBSTEILE.ASC'), asc_betriebsteile)
+
+    # create VERSIONE.ASC and BITFELD.ASC with one base version and one bitfield per service
+    logging.info('loading calendar.txt and calendar_dates.txt ...')
+    service_dates = dict()
+    for service in _iter_txt_file(input_path, 'calendar.txt'):
+        weekdays = [service[d] == '1' for d in ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')]
+
+        start_date = datetime.strptime(service['start_date'], '%Y%m%d')
+        end_date = datetime.strptime(service['end_date'], '%Y%m%d')
+
+        dates = service_dates.setdefault(service['service_id'], set())
+        for n in range((end_date - start_date).days + 1):
+            day = start_date + timedelta(n)
+            if weekdays[day.weekday()]:
+                dates.add(day)
+
+    for service_date in _iter_txt_file(input_path, 'calendar_dates.txt'):
+        dates = service_dates.setdefault(service_date['service_id'], set())
+        day = datetime.strptime(service_date['date'], '%Y%m%d')
+
+        if service_date['exception_type'] == '1':
+            dates.add(day)
+        else:
+            dates.discard(day)
+
+    all_dates = set().union(*service_dates.values())
+    if len(all_dates) == 0:
+        logging.error('could not find any service day in calendar.txt or calendar_dates.txt')
+        return
+
+    base_version_start_date = min(all_dates)
+    base_version_end_date = max(all_dates) + timedelta(1)
+
+    num_days = (base_version_end_date - base_version_start_date).days
+    if num_days > _BITFIELD_LENGTH * 4:
+        logging.warning(f"services span {num_days} days - only the first {_BITFIELD_LENGTH * 4} days are exported")
+
+        num_days = _BITFIELD_LENGTH * 4
+        base_version_end_date = base_version_start_date + timedelta(num_days)
+
+    asc_versione = create_asc_file('VERSIONE.ASC')
+
+    # the end date is exclusive, the same way it's interpreted when converting ISA to GTFS
+    asc_versione.records.append(asc_versione.create_record({
+        'ID': 1,
+        'Name': 'GTFS',
+        'StartDate': base_version_start_date.strftime('%d.%m.%Y'),
+        'EndDate': base_version_end_date.strftime('%d.%m.%Y'),
+        'BitfieldID': ''
+    }))
+
+    asc_bitfeld = create_asc_file('BITFELD.ASC')
+
+    bitfield_id_map = dict()
+    for bitfield_id, (service_id, dates) in enumerate(service_dates.items(), 1):
+        bitfield = ['0'] * (_BITFIELD_LENGTH * 4)
+        for day in dates:
+            c = (day - base_version_start_date).days
+            if c < num_days:
+                bitfield[c] = '1'
+
+        asc_bitfeld.records.append(asc_bitfeld.create_record({
+            'ID': bitfield_id,
+            'Bitfield': f"{int(''.join(bitfield), 2):0{_BITFIELD_LENGTH}X}"
+        }))
+
+        bitfield_id_map[service_id] = bitfield_id
+
+    logging.info('creating VERSIONE.ASC and BITFELD.ASC ...')
+    converter_context._write_asc_file(os.path.join(output_directory, 'VERSIONE.ASC'), asc_versione)
+    converter_context._write_asc_file(os.path.join(output_directory, 'BITFELD.ASC'), asc_bitfeld)
+
+    # create LINIEN.ASC with one line per route
+    logging.info('loading routes.txt ...')
+    txt_routes = list(_iter_txt_file(input_path, 'routes.txt'))
+    logging.info(f"found {len(txt_routes)} routes - converting now ...")
+
+    asc_linien = create_asc_file('LINIEN.ASC')
+
+    line_number_map = dict()
+    for n, route in enumerate(txt_routes, 1):
+        line_number = f"{n:05d}"
+
+        operator_organisation_id = operator_organisation_id_map.get(route.get('agency_id', ''))
+        if operator_organisation_id is None:
+            operator_organisation_id = next(iter(operator_organisation_id_map.values()))
+
+        route_type = route['route_type']
+        if route_type == '3':
+            vehicle_type_group = 'Bus'
+        elif route_type == '1':
+            vehicle_type_group = 'U-Bahn'
+        elif route_type == '2':
+            vehicle_type_group = 'Zug'
+        elif route_type == '0':
+            vehicle_type_group = 'Tram'
+        elif route_type == '4':
+            vehicle_type_group = 'Fähre'
+        elif route_type == '6':
+            vehicle_type_group = 'Seilbahn'
+        else:
+            logging.warning(f"route type {route_type} not supported by ISA - vehicle type group set to Bus for {route['route_id']}")
+            vehicle_type_group = 'Bus'
+
+        route_name = route.get('route_short_name', '')
+        if route_name == '':
+            route_name = route.get('route_long_name', '')
+
+        asc_linien.records.append(asc_linien.create_record({
+            'OperatorOrganisationID': operator_organisation_id,
+            'LineNumber': line_number,
+            'Name': route_name,
+            'VehicleTypeGroup': vehicle_type_group,
+            'InternationalLineID': route['route_id'],
+            'PseudoFlag': False,
+            'ExportNameFlag': False
+        }))
+
+        line_number_map[route['route_id']] = (line_number, operator_organisation_id)
+
+    logging.info('creating LINIEN.ASC ...')
+    converter_context._write_asc_file(os.path.join(output_directory, 'LINIEN.ASC'), asc_linien)
+
+    # create LDxxxxxx.ASC and FDxxxxxx.ASC, trips with the same direction and stops are a sub line
+    logging.info('loading trips.txt and stop_times.txt ...')
+    route_trips = dict()
+    for trip in _iter_txt_file(input_path, 'trips.txt'):
+        route_trips.setdefault(trip['route_id'], list()).append(trip)
+
+    trip_stop_times = dict()
+    for stop_time in _iter_txt_file(input_path, 'stop_times.txt'):
+        trip_stop_times.setdefault(stop_time['trip_id'], list()).append(stop_time)
+
+    for route in txt_routes:
+        line_number, operator_organisation_id = line_number_map[route['route_id']]
+
+        asc_ldxxxxxx = create_asc_file(f"LD{line_number}.ASC")
+        asc_fdxxxxxx = create_asc_file(f"FD{line_number}.ASC")
+
+        sub_lines = dict()
+        for trip in route_trips.get(route['route_id'], list()):
+            stop_times = trip_stop_times.get(trip['trip_id'])
+            if stop_times is None:
+                logging.warning(f"trip {trip['trip_id']} has no stop times - skipping")
+                continue
+
+            stop_times.sort(key=lambda stop_time: int(stop_time['stop_sequence']))
+
+            arrival_seconds = list()
+            departure_seconds = list()
+            for stop_time in stop_times:
+                arrival_time = stop_time['arrival_time'] or stop_time['departure_time']
+                departure_time = stop_time['departure_time'] or stop_time['arrival_time']
+
+                if arrival_time == '':
+                    break
+
+                arrival_seconds.append(_time2seconds(arrival_time))
+                departure_seconds.append(_time2seconds(departure_time))
+
+            if len(arrival_seconds) < len(stop_times):
+                logging.warning(f"trip {trip['trip_id']} has stop times without arrival and departure time - skipping")
+                continue
+
+            direction_id = str(int(trip.get('direction_id', '') or '0') + 1)
+            stop_ids = tuple(station_id_map[stop_time['stop_id']] for stop_time in stop_times)
+
+            # the time demand type contains all travel and waiting times as well as the pickup and drop off types
+            time_demand_type = tuple(
+                (
+                    max(arrival_seconds[i + 1] - departure_seconds[i], 0) if i + 1 < len(stop_times) else 0,
+                    max(departure_seconds[i] - arrival_seconds[i], 0),
+                    stop_time.get('pickup_type', '') == '1',
+                    stop_time.get('drop_off_type', '') == '1',
+                    stop_time.get('pickup_type', '') in ('2', '3') or stop_time.get('drop_off_type', '') in ('2', '3')
+                )
+                for i, stop_time in enumerate(stop_times)
+            )
+
+            sub_line = sub_lines.setdefault((direction_id, stop_ids), {'time_demand_types': dict(), 'trips': list()})
+            time_demand_type_index = sub_line['time_demand_types'].setdefault(time_demand_type, len(sub_line['time_demand_types']) + 1)
+
+            sub_line['trips'].append((trip, arrival_seconds[0], time_demand_type_index))
+
+        # trip IDs are numbered across all sub lines, so they are unique within the line
+        trip_index_offset = 0
+
+        for sub_line_number, ((direction_id, stop_ids), sub_line) in enumerate(sub_lines.items(), 1):
+            time_demand_types = list(sub_line['time_demand_types'].keys())
+
+            asc_ldxxxxxx.headers.append(asc_ldxxxxxx.create_header({
+                'LineNumber': line_number,
+                'LineVersionNumber': 1,
+                'LineVersionPriority': 1,
+                'OperatorOrganisationID': operator_organisation_id,
+                'SubLineNumber': sub_line_number,
+                'DirectionID': direction_id,
+                'NumStops': len(stop_ids),
+                'NumTimeDemandTypes': len(time_demand_types),
+                'VehicleTypeID': _VEHICLE_TYPE_ID,
+                'BitfieldID': ''
+            }))
+
+            asc_ldxxxxxx.records.append([
+                asc_ldxxxxxx.create_record({
+                    'ConsecutiveNumber': i + 1,
+                    'StopID': stop_id,
+                    'DIMENSIONS': [
+                        {
+                            'TravelTime': _seconds2duration(time_demand_type[i][0]),
+                            'WaitingTime': _seconds2duration(time_demand_type[i][1]),
+                            'NoEntry': time_demand_type[i][2],
+                            'NoExit': time_demand_type[i][3],
+                            'DemandStop': time_demand_type[i][4]
+                        } for time_demand_type in time_demand_types
+                    ]
+                }) for i, stop_id in enumerate(stop_ids)
+            ])
+
+            asc_fdxxxxxx.headers.append(asc_fdxxxxxx.create_header({
+                'LineNumber': line_number,
+                'LineVersionNumber': 1,
+                'OperatorOrganisationID': operator_organisation_id,
+                'DirectionID': direction_id,
+                'SubLineNumber': sub_line_number,
+                'NumTrips': len(sub_line['trips'])
+            }))
+
+            asc_fdxxxxxx.records.append([
+                asc_fdxxxxxx.create_record({
+                    'PositionSequenceStartStop': 1,
+                    'StartStopID': stop_ids[0],
+                    'StartTime': _seconds2time(start_seconds),
+                    'PositionSequenceDestinationStop': len(stop_ids),
+                    'DestinationStopID': stop_ids[-1],
+                    'TimeDemandType': time_demand_type_index,
+                    'ExternalTripNumber': trip.get('trip_short_name', ''),
+                    'NumFollowingTrips': 0,
+                    'TimeSpanFollowingTrips': '00:00',
+                    'BitfieldID': bitfield_id_map.get(trip['service_id'], ''),
+                    'ID': str(trip_index),
+                    'InternationalTripID': trip['trip_id']
+                }) for trip_index, (trip, start_seconds, time_demand_type_index) in enumerate(sub_line['trips'], trip_index_offset + 1)
+            ])
+
+            trip_index_offset += len(sub_line['trips'])
+
+        logging.info(f"creating LD{line_number}.ASC and FD{line_number}.ASC ...")
+        converter_context._write_asc_file(os.path.join(output_directory, f"LD{line_number}.ASC"), asc_ldxxxxxx)
+        converter_context._write_asc_file(os.path.join(output_directory, f"FD{line_number}.ASC"), asc_fdxxxxxx)
+
+def _iter_txt_file(input_path, txt_filename):
+    if input_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(input_path) as input_zip:
+            if txt_filename not in input_zip.namelist():
+                return
+
+            with io.TextIOWrapper(input_zip.open(txt_filename), encoding='utf-8-sig', newline='') as txt_file:
+                yield from csv.DictReader(txt_file)
+    else:
+        if not os.path.isfile(os.path.join(input_path, txt_filename)):
+            return
+
+        with open(os.path.join(input_path, txt_filename), newline='', encoding='utf-8-sig') as txt_file:
+            yield from csv.DictReader(txt_file)
+
+def _time2seconds(input_string: str):
+    hours, minutes, seconds = input_string.strip().split(':')
+
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+def _seconds2time(input_seconds: int):
+    hours, remainder = divmod(input_seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def _seconds2duration(input_seconds: int):
+    minutes, seconds = divmod(input_seconds, 60)
+
+    return f"{minutes:02d}:{seconds:02d}"
@@ -0,0 +1,452 @@
+import csv
+import io
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+_TXT_BUFFER_SIZE = 1024 * 1024
+
+# tables waiting for a ZIP entry are moved from memory to a temporary file beyond this size
+_ZIP_SPOOL_SIZE = 16 * 1024 * 1024
+
+_PARQUET_ROW_GROUP_SIZE = 100000
+
+# typed sinks store these columns as integers, floats or times in seconds after midnight, all others as strings
+_COLUMN_TYPES = {
+    'location_type': 'int',
+    'wheelchair_boarding': 'int',
+    'route_type': 'int',
+    'direction_id': 'int',
+    'wheelchair_accessible': 'int',
+    'bikes_allowed': 'int',
+    'stop_sequence': 'int',
+    'pickup_type': 'int',
+    'drop_off_type': 'int',
+    'monday': 'int',
+    'tuesday': 'int',
+    'wednesday': 'int',
+    'thursday': 'int',
+    'friday': 'int',
+    'saturday': 'int',
+    'sunday': 'int',
+    'exception_type': 'int',
+    'stop_lat': 'float',
+    'stop_lon': 'float',
+    'shape_dist_traveled': 'float',
+    'shape_dist_travelled': 'float',
+    'arrival_time': 'time',
+    'departure_time': 'time'
+}
+
+_SQLITE_TYPES = {'int': 'INTEGER', 'float': 'REAL', 'time': 'INTEGER', 'str': 'TEXT'}
+
+# indexes are created after all rows are inserted
+_SQLITE_INDEXES = {
+    'stops': ['stop_id', 'parent_station'],
+    'routes': ['route_id'],
+    'trips': ['trip_id', 'route_id', 'service_id'],
+    'stop_times': ['trip_id', 'stop_id'],
+    'calendar': ['service_id'],
+    'calendar_dates': ['service_id', 'date']
+}
+
+########################################################################################################################
+# Output sinks receiving the GTFS tables of a conversion.
+########################################################################################################################
+
+def create_sink(output):
+    if output.lower().endswith('.zip'):
+        return ZipSink(output)
+    else:
+        return DirectorySink(output)
+
+class GtfsSink:
+
+    # open_table returns a writer with the methods writerow and writerows, which receives all rows of the table
+    def open_table(self, table_name, headers):
+        raise NotImplementedError()
+
+    def close_table(self, table_name):
+        pass
+
+    def close(self):
+        pass
+
+    # discard is called instead of close if the conversion failed, sinks which can't remove their output are only closed
+    def discard(self):
+        self.close()
+
+class DirectorySink(GtfsSink):
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        self._txt_files = dict()
+
+    def open_table(self, table_name, headers):
+        txt_file = open(os.path.join(self.directory, table_name), 'w', newline='', encoding='utf-8', buffering=_TXT_BUFFER_SIZE)
+        self._txt_files[table_name] = txt_file
+
+        csv_writer = csv.writer(txt_file, delimiter=',', quotechar='"')
+        csv_writer.writerow(headers)
+
+        return csv_writer
+
+    def close_table(self, table_name):
+        self._txt_files.pop(table_name).close()
+
+    def close(self):
+        for table_name in list(self._txt_files.keys()):
+            self.close_table(table_name)
+
+class ZipSink(GtfsSink):
+
+    def __init__(self, filename):
+        self.filename = filename
+
+        # the archive is written to a temporary file first, so a failed conversion never leaves an incomplete archive
+        self._temp_filename = f"{filename}.partial"
+
+        logging.info(f"creating ZIP archive {filename} ...")
+        self._output_zip = zipfile.ZipFile(self._temp_filename, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._output_zip_entry = None
+        self._output_zip_pending = list()
+
+        self._txt_files = dict()
+
+    def open_table(self, table_name, headers):
+        if self._output_zip_entry is None:
+            # stream the table directly into its ZIP entry
+            self._output_zip_entry = table_name
+
+            txt_file = io.TextIOWrapper(
+                self._output_zip.open(table_name, 'w', force_zip64=True),
+                encoding='utf-8',
+                newline=''
+            )
+        else:
+            # a ZIP archive can only write one entry at a time, further tables are buffered until the entry is free, large ones in a temporary file
+            txt_file = tempfile.SpooledTemporaryFile(max_size=_ZIP_SPOOL_SIZE, mode='w+', newline='', encoding='utf-8')
+
+        self._txt_files[table_name] = txt_file
+
+        csv_writer = csv.writer(txt_file, delimiter=',', quotechar='"')
+        csv_writer.writerow(headers)
+
+        return csv_writer
+
+    def close_table(self, table_name):
+        txt_file = self._txt_files.pop(table_name)
+
+        if table_name == self._output_zip_entry:
+            txt_file.close()
+            self._output_zip_entry = None
+
+            # write all tables which were closed while the ZIP entry was busy
+            for pending_table_name, pending_file in self._output_zip_pending:
+                self._write_pending_table(pending_table_name, pending_file)
+
+            self._output_zip_pending = list()
+        elif self._output_zip_entry is not None:
+            self._output_zip_pending.append((table_name, txt_file))
+        else:
+            self._write_pending_table(table_name, txt_file)
+
+    def close(self):
+        # the streamed entry is closed first, so tables waiting for it are written afterwards
+        if self._output_zip_entry is not None:
+            self.close_table(self._output_zip_entry)
+
+        for table_name in list(self._txt_files.keys()):
+            self.close_table(table_name)
+
+        self._output_zip.close()
+        os.replace(self._temp_filename, self.filename)
+
+    def discard(self):
+        try:
+            for txt_file in list(self._txt_files.values()) + [pending_file for _, pending_file in self._output_zip_pending]:
+                txt_file.close()
+
+            self._output_zip.close()
+        finally:
+            if os.path.isfile(self._temp_filename):
+                os.remove(self._temp_filename)
+
+    def _write_pending_table(self, table_name, txt_file):
+        txt_file.seek(0)
+
+        with io.TextIOWrapper(self._output_zip.open(table_name, 'w', force_zip64=True), encoding='utf-8', newline='') as zip_entry:
+            shutil.copyfileobj(txt_file, zip_entry, _TXT_BUFFER_SIZE)
+
+        txt_file.close()
+
+class MemorySink(GtfsSink):
+
+    def __init__(self):
+        self.tables = dict()
+
+    def open_table(self, table_name, headers):
+        self.tables[table_name] = MemoryTable(headers)
+
+        return self.tables[table_name]
+
+    def rows(self, table_name):
+        return iter(self.tables[table_name].rows)
+
+    def columns(self, table_name):
+        return self.tables[table_name].columns()
+
+class MemoryTable:
+
+    def __init__(self, headers):
+        self.headers = list(headers)
+        self.rows = list()
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+    def writerows(self, rows):
+        self.rows.extend(rows)
+
+    def columns(self):
+        # columnar representation of the table, values are kept as they were produced by the converter
+        if len(self.rows) == 0:
+            return {header: list() for header in self.headers}
+
+        return {header: list(values) for header, values in zip(self.headers, zip(*self.rows))}
+
+class MultiSink(GtfsSink):
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def open_table(self, table_name, headers):
+        return MultiTableWriter([sink.open_table(table_name, headers) for sink in self.sinks])
+
+    def close_table(self, table_name):
+        for sink in self.sinks:
+            sink.close_table(table_name)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def discard(self):
+        for sink in self.sinks:
+            sink.discard()
+
+class MultiTableWriter:
+
+    def __init__(self, writers):
+        self.writers = writers
+
+    def writerow(self, row):
+        for writer in self.writers:
+            writer.writerow(row)
+
+    def writerows(self, rows):
+        # rows are passed to several writers, so iterators are consumed only once
+        if not isinstance(rows, list):
+            rows = list(rows)
+
+        for writer in self.writers:
+            writer.writerows(rows)
+
+class SqliteSink(GtfsSink):
+
+    def __init__(self, filename):
+        self.filename = filename
+
+        # the database is written to a temporary file first, so a failed conversion never leaves an incomplete database
+        self._temp_filename = f"{filename}.partial"
+
+        if os.path.isfile(self._temp_filename):
+            os.remove(self._temp_filename)
+
+        logging.info(f"creating SQLite database {filename} ...")
+        self._connection = sqlite3.connect(self._temp_filename)
+
+        # the database is written once from scratch, so journaling is not required
+        self._connection.execute('PRAGMA journal_mode = OFF')
+        self._connection.execute('PRAGMA synchronous = OFF')
+
+        self._table_names = list()
+
+    def open_table(self, table_name, headers):
+        sql_table_name = os.path.splitext(table_name)[0]
+        self._table_names.append(sql_table_name)
+
+        column_definitions = ', '.join(f'"{header}" {_SQLITE_TYPES[_column_type(header)]}' for header in headers)
+        self._connection.execute(f'CREATE TABLE "{sql_table_name}" ({column_definitions})')
+
+        return SqliteTableWriter(self._connection, sql_table_name, headers)
+
+    def close(self):
+        for sql_table_name in self._table_names:
+            for column in _SQLITE_INDEXES.get(sql_table_name, list()):
+                self._connection.execute(f'CREATE INDEX "idx_{sql_table_name}_{column}" ON "{sql_table_name}" ("{column}")')
+
+        self._connection.commit()
+        self._connection.close()
+
+        os.replace(self._temp_filename, self.filename)
+
+    def discard(self):
+        try:
+            self._connection.close()
+        finally:
+            if os.path.isfile(self._temp_filename):
+                os.remove(self._temp_filename)
+
+class SqliteTableWriter:
+
+    def __init__(self, connection, sql_table_name, headers):
+        self._connection = connection
+        self._converters = [_column_converter(header) for header in headers]
+
+        self._insert = f'INSERT INTO "{sql_table_name}" VALUES ({", ".join("?" for _ in headers)})'
+
+    def writerow(self, row):
+        self.writerows([row])
+
+    def writerows(self, rows):
+        self._connection.executemany(self._insert, zip(*_typed_columns(self._converters, rows)))
+
+class ParquetSink(GtfsSink):
+
+    def __init__(self, directory, row_group_size=_PARQUET_ROW_GROUP_SIZE):
+        if pyarrow is None:
+            raise ImportError('writing Parquet files requires pyarrow')
+
+        self.directory = directory
+        self.row_group_size = row_group_size
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._writers = dict()
+        self._filenames = list()
+
+    def open_table(self, table_name, headers):
+        parquet_filename = os.path.join(self.directory, f"{os.path.splitext(table_name)[0]}.parquet")
+        self._filenames.append(parquet_filename)
+        self._writers[table_name] = ParquetTableWriter(parquet_filename, headers, self.row_group_size)
+
+        return self._writers[table_name]
+
+    def close_table(self, table_name):
+        self._writers.pop(table_name).close()
+
+    def close(self):
+        for table_name in list(self._writers.keys()):
+            self.close_table(table_name)
+
+    def discard(self):
+        # files of tables which were already complete are removed as well
+        for table_name in list(self._writers.keys()):
+            self._writers.pop(table_name).close()
+
+        for parquet_filename in self._filenames:
+            if os.path.isfile(parquet_filename):
+                os.remove(parquet_filename)
+
+class ParquetTableWriter:
+
+    def __init__(self, filename, headers, row_group_size):
+        self._converters = [_column_converter(header) for header in headers]
+        self._row_group_size = row_group_size
+
+        self._schema = pyarrow.schema([(header, _parquet_type(_column_type(header))) for header in headers])
+        self._writer = pyarrow.parquet.ParquetWriter(filename, self._schema)
+
+        self._rows = list()
+
+    def writerow(self, row):
+        self.writerows([row])
+
+    def writerows(self, rows):
+        # rows are collected until a row group is complete
+        self._rows.extend(rows)
+
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+    def _flush(self):
+        if len(self._rows) == 0:
+            return
+
+        columns = _typed_columns(self._converters, self._rows)
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(columns, self._schema)]
+
+        self._writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self._schema))
+        self._rows = list()
+
+def _column_type(header):
+    return _COLUMN_TYPES.get(header, 'str')
+
+def _column_converter(header):
+    column_type = _column_type(header)
+
+    # numeric columns only have few distinct values, so each value is converted once and then looked up
+    if column_type == 'int':
+        return TypedValues(_str2int).__getitem__
+    elif column_type == 'float':
+        return TypedValues(_str2float).__getitem__
+    elif column_type == 'time':
+        return TypedValues(_time2seconds).__getitem__
+    else:
+        return _str2str
+
+class TypedValues(dict):
+
+    def __init__(self, convert):
+        self._convert = convert
+
+    def __missing__(self, value):
+        typed_value = self[value] = self._convert(value)
+        return typed_value
+
+def _typed_columns(converters, rows):
+    columns = list(zip(*rows))
+    if len(columns) == 0:
+        return [list() for _ in converters]
+
+    return [list(map(c, values)) for c, values in zip(converters, columns)]
+
+# empty values are stored as NULL in all typed sinks
+def _str2int(value):
+    return int(value) if value is not None and value != '' else None
+
+def _str2float(value):
+    return float(value) if value is not None and value != '' else None
+
+def _str2str(value):
+    return str(value) if value is not None and value != '' else None
+
+def _time2seconds(time_string):
+    if time_string is None or time_string == '':
+        return None
+
+    h, m, s = time_string.split(':')
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+def _parquet_type(column_type):
+    if column_type == 'int' or column_type == 'time':
+        return pyarrow.int32()
+    elif column_type == 'float':
+        return pyarrow.float64()
+    else:
+        return pyarrow.string()
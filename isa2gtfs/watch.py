@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from isa2gtfs.asc import AscCache, AscMemoryCache
+from isa2gtfs.converter import IsaGtfsConverter, load_config, compile_mapping
+
+########################################################################################################################
+# Long-running conversion of ISA deliveries arriving in an inbox directory.
+########################################################################################################################
+
+# parsed tables of these files are kept in memory between conversions, as they rarely change between deliveries
+_WARM_ASC_FILES = ['ATTRIBUT.ASC', 'HSTATTRI.ASC', 'HALTESTE.ASC', 'TARIF.ASC', 'BETRIEBE.ASC', 'BETRIEBSTEILE.ASC', 'LINIEN.ASC', 'VERSIONE.ASC', 'BITFELD.ASC']
+
+class InboxWatcher:
+
+    def __init__(self, inbox_directory, output_directory, config_filename=None, workers=1, use_cache=True, interval=10):
+        self.inbox_directory = inbox_directory
+        self.output_directory = output_directory
+        self.interval = interval
+
+        self._workers = workers
+
+        # the config and its mapping templates are loaded once for all deliveries
+        self._config = load_config(config_filename)
+        compile_mapping(self._config)
+
+        # parsed ASC files which are not kept in memory still use the cache directory, if configured
+        cache_directory = self._config['config'].get('cache_directory', None)
+        if use_cache and cache_directory is not None:
+            cache_max_size = self._config['config'].get('cache_max_size', 1024)
+            fallback_cache = AscCache(cache_directory, cache_max_size * 1024 * 1024)
+        else:
+            fallback_cache = None
+
+        self._asc_cache = AscMemoryCache(_WARM_ASC_FILES, fallback=fallback_cache)
+
+        self._signatures = dict()
+        self._processed = dict()
+
+        self.status = {
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'inbox': inbox_directory,
+            'output': output_directory,
+            'converted': 0,
+            'failed': 0,
+            'last_poll': None,
+            'last_delivery': None
+        }
+
+        self._last_metrics = None
+        self._lock = threading.Lock()
+
+    def run(self, health_port=None):
+        if health_port is not None:
+            self._start_health_server(health_port)
+
+        logging.info(f"watching {self.inbox_directory} for ISA deliveries every {self.interval}s ...")
+
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            logging.info('stopped watching')
+
+    def poll(self):
+        os.makedirs(self.output_directory, exist_ok=True)
+
+        converted = list()
+        for delivery_name in sorted(os.listdir(self.inbox_directory)):
+            delivery_path = os.path.join(self.inbox_directory, delivery_name)
+
+            # deliveries are ZIP files or directories, hidden and partially transferred files are ignored
+            if delivery_name.startswith('.'):
+                continue
+
+            if os.path.isfile(delivery_path) and delivery_name.lower().endswith('.zip'):
+                output_name = f"{delivery_name[:-4]}.zip"
+            elif os.path.isdir(delivery_path):
+                output_name = f"{delivery_name}.zip"
+            else:
+                continue
+
+            signature = _delivery_signature(delivery_path)
+            if len(signature) == 0:
+                continue
+
+            # a delivery is converted once it did not change since the last poll
+            previous_signature = self._signatures.get(delivery_name)
+            self._signatures[delivery_name] = signature
+
+            if signature != previous_signature or self._processed.get(delivery_name) == signature:
+                continue
+
+            # after a restart, deliveries with an up-to-date output are not converted again
+            output_filename = os.path.join(self.output_directory, output_name)
+            if delivery_name not in self._processed and os.path.isfile(output_filename) and os.path.getmtime(output_filename) >= max(s[2] for s in signature) / 1e9:
+                self._processed[delivery_name] = signature
+                continue
+
+            self._processed[delivery_name] = signature
+            if self._convert_delivery(delivery_name, delivery_path, output_filename):
+                converted.append(delivery_name)
+
+        with self._lock:
+            self.status['last_poll'] = datetime.now().isoformat(timespec='seconds')
+
+        return converted
+
+    def _convert_delivery(self, delivery_name, delivery_path, output_filename):
+        logging.info(f"converting delivery {delivery_name} ...")
+
+        # the output is written to a temporary file first, so consumers never see an incomplete feed
+        temp_filename = os.path.join(self.output_directory, f".{os.path.basename(output_filename)[:-4]}.partial.zip")
+
+        start = time.perf_counter()
+        try:
+            converter = IsaGtfsConverter(config=self._config, workers=self._workers, asc_cache=self._asc_cache)
+            converter.convert(delivery_path, temp_filename)
+
+            os.replace(temp_filename, output_filename)
+        except Exception:
+            logging.exception(f"delivery {delivery_name} failed")
+
+            if os.path.isfile(temp_filename):
+                os.remove(temp_filename)
+
+            self._update_status(delivery_name, 'failed', time.perf_counter() - start)
+            return False
+
+        wall_time = time.perf_counter() - start
+        logging.info(f"converted delivery {delivery_name} to {output_filename} in {wall_time:.2f}s")
+
+        self._update_status(delivery_name, 'ok', wall_time, converter._stage_metrics)
+        return True
+
+    def _update_status(self, delivery_name, delivery_status, wall_time, stage_metrics=None):
+        with self._lock:
+            self.status['converted' if delivery_status == 'ok' else 'failed'] += 1
+            self.status['last_delivery'] = {
+                'name': delivery_name,
+                'status': delivery_status,
+                'finished': datetime.now().isoformat(timespec='seconds'),
+                'wall_time': wall_time
+            }
+
+            if stage_metrics is not None:
+                self._last_metrics = stage_metrics
+
+    def _create_health(self):
+        with self._lock:
+            health = dict(self.status)
+
+        health['cache'] = {'entries': len(self._asc_cache), 'hits': self._asc_cache.hits, 'misses': self._asc_cache.misses}
+
+        return health
+
+    def _create_metrics(self):
+        metrics = self._create_health()
+
+        with self._lock:
+            metrics['stages'] = self._last_metrics
+
+        return metrics
+
+    def _start_health_server(self, health_port):
+        watcher = self
+
+        class HealthRequestHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path == '/health':
+                    self._send_json(watcher._create_health())
+                elif self.path == '/metrics':
+                    self._send_json(watcher._create_metrics())
+                else:
+                    self.send_error(404)
+
+            def _send_json(self, data):
+                body = json.dumps(data, indent=4).encode('utf-8')
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+        # the endpoint is only bound to the local host
+        health_server = ThreadingHTTPServer(('127.0.0.1', health_port), HealthRequestHandler)
+        threading.Thread(target=health_server.serve_forever, daemon=True).start()
+
+        logging.info(f"serving health and metrics on http://127.0.0.1:{health_port}/health and /metrics")
+
+def _delivery_signature(delivery_path):
+    if os.path.isfile(delivery_path):
+        delivery_stat = os.stat(delivery_path)
+        return ((os.path.basename(delivery_path), delivery_stat.st_size, delivery_stat.st_mtime_ns), )
+
+    signature = list()
+    for filename in sorted(os.listdir(delivery_path)):
+        file_stat = os.stat(os.path.join(delivery_path, filename))
+        signature.append((filename, file_stat.st_size, file_stat.st_mtime_ns))
+
+    return tuple(signature)
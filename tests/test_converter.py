@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from benchmark.generator import generate
+from isa2gtfs.converter import IsaGtfsConverter
+
+class IsaGtfsConverterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        self.input_directory = os.path.join(self.directory, 'isa')
+        generate(self.input_directory, num_stops=10, num_lines=2, num_sub_lines=2, num_trips=3, num_time_demand_types=1, num_stops_per_sub_line=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_failed_conversion(self):
+        output_filename = os.path.join(self.directory, 'gtfs.zip')
+
+        # the second line can't be converted without its LDxxxxxx file
+        os.remove(os.path.join(self.input_directory, 'LD00002.ASC'))
+
+        with self.assertRaises(FileNotFoundError):
+            IsaGtfsConverter(use_cache=False).convert(self.input_directory, output_filename)
+
+        self.assertEqual(os.listdir(self.directory), ['isa'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from benchmark.generator import generate
+from isa2gtfs.converter import IsaGtfsConverter, load_config
+from isa2gtfs.dialect import init51
+from isa2gtfs.sink import MemorySink
+
+class IncrementalConversionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        self.config = load_config()
+        self.config['config']['incremental_directory'] = os.path.join(self.directory, 'fragments')
+
+        # two deliveries of different operators using the same line numbers
+        self.input_x = os.path.join(self.directory, 'x')
+        self.input_y = os.path.join(self.directory, 'y')
+
+        generate(self.input_x, num_stops=10, num_lines=2, num_sub_lines=2, num_trips=3, num_time_demand_types=1, num_stops_per_sub_line=4, seed=1)
+        generate(self.input_y, num_stops=10, num_lines=2, num_sub_lines=2, num_trips=5, num_time_demand_types=1, num_stops_per_sub_line=4, seed=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_inputs_sharing_fragments(self):
+        converter, expected = self._convert(self.input_x)
+        self._convert(self.input_y)
+
+        # the fragments of the first delivery are still used after converting the second one
+        converter, actual = self._convert(self.input_x)
+
+        self.assertNotIn('FDxxxxxx.ASC', converter._stage_metrics['trips']['rows'])
+        self.assertEqual(self._trip_tables(expected), self._trip_tables(actual))
+
+    def test_fragment_replaced_after_check(self):
+        converter, expected = self._convert(self.input_x)
+
+        # another conversion replaces a fragment between checking and loading it
+        fragment_directory = init51._fragment_directory(self.config['config']['incremental_directory'], mock.Mock(input_path=self.input_x))
+        for fragment_filename in os.listdir(fragment_directory):
+            init51._store_fragment(os.path.join(fragment_directory, fragment_filename), 'other', [], [], dict())
+
+        with mock.patch.object(init51, '_check_fragment', return_value=True):
+            converter, actual = self._convert(self.input_x)
+
+        self.assertEqual(self._trip_tables(expected), self._trip_tables(actual))
+
+    def _convert(self, input_directory):
+        converter = IsaGtfsConverter(config=self.config, use_cache=False)
+        sink = converter.convert(input_directory, MemorySink())
+
+        return converter, sink
+
+    def _trip_tables(self, sink):
+        return list(sink.rows('trips.txt')), list(sink.rows('stop_times.txt'))
+
+if __name__ == '__main__':
+    unittest.main()
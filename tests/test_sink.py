@@ -0,0 +1,48 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from unittest import mock
+
+from isa2gtfs import sink
+from isa2gtfs.sink import ZipSink
+
+class ZipSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_interleaved_tables(self):
+        output_filename = os.path.join(self.directory, 'gtfs.zip')
+
+        # trips.txt is written while stop_times.txt is streamed and exceeds the buffer size
+        with mock.patch.object(sink, '_ZIP_SPOOL_SIZE', 64):
+            zip_sink = ZipSink(output_filename)
+
+            stop_times = zip_sink.open_table('stop_times.txt', ['trip_id', 'stop_sequence'])
+            trips = zip_sink.open_table('trips.txt', ['route_id', 'trip_id'])
+
+            for i in range(100):
+                trips.writerow(['1', f"trip-{i}"])
+                stop_times.writerows([[f"trip-{i}", '1'], [f"trip-{i}", '2']])
+
+            zip_sink.close_table('trips.txt')
+            zip_sink.close()
+
+        self.assertEqual(os.listdir(self.directory), ['gtfs.zip'])
+
+        with zipfile.ZipFile(output_filename, 'r') as output_zip:
+            trips_data = io.TextIOWrapper(output_zip.open('trips.txt'), encoding='utf-8').read()
+            stop_times_data = io.TextIOWrapper(output_zip.open('stop_times.txt'), encoding='utf-8').read()
+
+        self.assertEqual(trips_data.splitlines(), ['route_id,trip_id'] + [f"1,trip-{i}" for i in range(100)])
+        self.assertEqual(len(stop_times_data.splitlines()), 201)
+
+if __name__ == '__main__':
+    unittest.main()
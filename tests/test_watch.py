@@ -0,0 +1,72 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from benchmark.generator import generate
+from isa2gtfs.watch import InboxWatcher
+
+class InboxWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+        self.inbox_directory = os.path.join(self.directory, 'inbox')
+        self.output_directory = os.path.join(self.directory, 'output')
+
+        os.makedirs(self.inbox_directory)
+
+        # a small synthetic delivery packed as ZIP archive
+        self.isa_directory = os.path.join(self.directory, 'isa')
+        generate(self.isa_directory, num_stops=10, num_lines=2, num_sub_lines=2, num_trips=3, num_time_demand_types=1, num_stops_per_sub_line=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replaced_delivery(self):
+        delivery_filename = os.path.join(self.inbox_directory, 'd.zip')
+        output_filename = os.path.join(self.output_directory, 'd.zip')
+
+        self._write_delivery(delivery_filename)
+
+        watcher = InboxWatcher(self.inbox_directory, self.output_directory, use_cache=False, interval=0)
+        watcher.poll()
+        self.assertEqual(watcher.poll(), ['d.zip'])
+        self.assertIn('Station 1,', self._read_stops(output_filename))
+
+        # replace the delivery in place with a renamed station
+        self._write_delivery(delivery_filename, {'Station 1 ': 'Renamed 1 '})
+
+        stat = os.stat(delivery_filename)
+        os.utime(delivery_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        watcher.poll()
+        self.assertEqual(watcher.poll(), ['d.zip'])
+
+        stops = self._read_stops(output_filename)
+        self.assertIn('Renamed 1,', stops)
+        self.assertNotIn('Station 1,', stops)
+
+    def _write_delivery(self, delivery_filename, replacements=dict()):
+        temp_filename = f"{delivery_filename}.tmp"
+
+        with zipfile.ZipFile(temp_filename, 'w') as delivery_zip:
+            for filename in sorted(os.listdir(self.isa_directory)):
+                with open(os.path.join(self.isa_directory, filename), 'r', encoding='ISO-8859-1') as asc_file:
+                    asc_data = asc_file.read()
+
+                for old_value, new_value in replacements.items():
+                    asc_data = asc_data.replace(old_value, new_value)
+
+                delivery_zip.writestr(filename, asc_data.encode('ISO-8859-1'))
+
+        os.replace(temp_filename, delivery_filename)
+
+    def _read_stops(self, output_filename):
+        with zipfile.ZipFile(output_filename, 'r') as output_zip:
+            return io.TextIOWrapper(output_zip.open('stops.txt'), encoding='utf-8').read()
+
+if __name__ == '__main__':
+    unittest.main()